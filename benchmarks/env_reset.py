@@ -0,0 +1,42 @@
+"""
+benchmark of SimulationEnvironment.reset_from_file against building a fresh
+SimulationEnvironment, for many short runs that only change the seed.
+
+Run from the repository root:
+    $ python -m benchmarks.env_reset
+"""
+import argparse
+from time import perf_counter
+
+from src.grana_model.simulationenv import SimulationEnvironment
+
+
+def main(filename: str, object_data_exists: bool, num_runs: int):
+    start = perf_counter()
+    for seed in range(1, num_runs + 1):
+        sim_env = SimulationEnvironment(
+            pos_csv_filename=filename,
+            object_data_exists=object_data_exists,
+            spawn_seed=seed,
+        )
+        sim_env.setup_model()
+    construct_s = (perf_counter() - start) / num_runs
+
+    start = perf_counter()
+    for seed in range(1, num_runs + 1):
+        sim_env.reset_from_file(filename, object_data_exists, spawn_seed=seed)
+    reset_s = (perf_counter() - start) / num_runs
+
+    print("construct_ms,reset_ms,speedup")
+    print(f"{construct_s * 1e3:.2f},{reset_s * 1e3:.2f},{construct_s / reset_s:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-filename", type=str, default="082620_SEM_final_coordinates.csv"
+    )
+    parser.add_argument("-object_data_exists", action="store_true")
+    parser.add_argument("-num_runs", type=int, default=20)
+    args = parser.parse_args()
+    main(**vars(args))
@@ -0,0 +1,74 @@
+"""
+tracemalloc benchmark of memory per PSIIStructure and per Particle at 1k, 10k
+and 100k objects.
+
+tracemalloc only sees allocations made through the Python allocator, so the
+numbers cover the Python wrappers (slots, undo record, pymunk Body and Shape
+objects) but not the Chipmunk structs that pymunk allocates in C.
+
+Run from the repository root:
+    $ python -m benchmarks.object_memory
+"""
+import argparse
+import gc
+import tracemalloc
+
+import numpy as np
+import pymunk
+
+from src.grana_model.objectdata import ObjectData
+from src.grana_model.particle import Particle
+from src.grana_model.spawner import Spawner
+
+
+def measure(create, n: int) -> float:
+    """returns the traced bytes per object of keeping n objects alive"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = create(n)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / n
+
+
+def main(sizes: list, seed: int):
+    object_data = ObjectData(pos_csv_filename=None)
+
+    def create_psii(n: int):
+        spawner = Spawner(
+            object_data=object_data,
+            shape_type="complex",
+            space=pymunk.Space(),
+            batch=None,
+            spawn_type="psii_only",
+            num_psii=n,
+            spawn_seed=seed,
+        )
+        obj_types = spawner.rng.choice(["C2S2M2", "C2S2", "LHCII"], n)
+        return spawner.spawn_bulk(
+            obj_types,
+            spawner.random_pos_in_circle_array(n),
+            spawner.random_angles(n),
+        )
+
+    def create_particles(n: int):
+        space = pymunk.Space()
+        positions = np.random.default_rng(seed).random((n, 2)) * 400
+        return [
+            Particle(space=space, pos=tuple(pos), batch=None)
+            for pos in positions.tolist()
+        ]
+
+    print("objects,psii_bytes_per_object,particle_bytes_per_object")
+    for n in sizes:
+        print(f"{n},{measure(create_psii, n):.0f},{measure(create_particles, n):.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("-seed", type=int, default=1)
+    args = parser.parse_args()
+    main(**vars(args))
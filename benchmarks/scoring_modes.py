@@ -0,0 +1,91 @@
+"""
+benchmark of the time per agent action with step scoring (a full
+space.step() per evaluation) against geometry scoring (reindex the moved body
+and score its overlap from the shape geometry) and area scoring (the exact
+overlap area of the shapes, so its overlap values are areas, not depths).
+
+Also checks that a geometry-scored action followed by undo() puts every body
+back exactly where it was.
+
+Run from the repository root:
+    $ python -m benchmarks.scoring_modes
+"""
+import argparse
+import random
+from time import perf_counter
+
+from src.grana_model.overlapagent import OverlapAgent, SingleZone
+from src.grana_model.simulationenv import SimulationEnvironment
+
+
+def make_agent(filename: str, spawn_type: str, scoring: str, seed: int):
+    random.seed(seed)
+    sim_env = SimulationEnvironment(
+        pos_csv_filename=filename, object_data_exists=False, spawn_seed=seed
+    )
+    sim_env.spawner.spawn_type = spawn_type
+    object_list, _ = sim_env.setup_model()
+    overlap_agent = OverlapAgent(
+        space=sim_env.space,
+        object_list=object_list,
+        collision_handler=sim_env.collision_handler,
+        area_strategy=SingleZone(object_list),
+        scoring=scoring,
+    )
+    overlap_agent.overlap_distance = overlap_agent._update_space()
+    return overlap_agent, object_list
+
+
+def get_state(object_list: list) -> list:
+    return [(tuple(obj.body.position), obj.body.angle) for obj in object_list]
+
+
+def check_undo_exact(overlap_agent, object_list, num_checks: int) -> bool:
+    for obj in random.sample(object_list, num_checks):
+        state = get_state(object_list)
+        obj.action(random.randint(1, 2))
+        overlap_agent.geometry_scorer.update(obj)
+        obj.undo()
+        overlap_agent.geometry_scorer.update(obj)
+        if get_state(object_list) != state:
+            return False
+    return True
+
+
+def main(filename: str, spawn_type: str, num_actions: int, seed: int):
+    print("scoring,objects,us_per_action,overlap_begin,overlap_end")
+    for scoring in ["step", "geometry", "area"]:
+        overlap_agent, object_list = make_agent(
+            filename, spawn_type, scoring, seed
+        )
+        overlap_begin = overlap_agent.overlap_distance
+
+        start = perf_counter()
+        overlap_agent.run(num_actions=num_actions)
+        elapsed = perf_counter() - start
+
+        print(
+            f"{scoring},{len(object_list)},{elapsed / num_actions * 1e6:.1f},"
+            f"{overlap_begin:.2f},{overlap_agent.overlap_distance:.2f}"
+        )
+        if scoring == "geometry":
+            geometry_agent = overlap_agent, object_list
+
+    print(f"geometry undo exact: {check_undo_exact(*geometry_agent, 100)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-filename", type=str, default="082620_SEM_final_coordinates.csv"
+    )
+    parser.add_argument(
+        "-spawn_type",
+        type=str,
+        default="psii_secondary_noparticles",
+        help="psii_secondary_noparticles includes the dynamic LHCII and cytb6f",
+    )
+    parser.add_argument("-num_actions", type=int, default=2000)
+    parser.add_argument("-seed", type=int, default=1)
+    args = parser.parse_args()
+    main(**vars(args))
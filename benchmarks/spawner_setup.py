@@ -0,0 +1,122 @@
+"""
+benchmark of model setup time for the per-object spawning path against the
+bulk spawning path, from the default 211 PSII up to 50,000 PSII-equivalents.
+
+A PSII-equivalent is one PSII structure plus its share of secondary
+structures (LHCII and cytb6f at the Spawner ratios). The disc radius is scaled
+with the object count so the packing density matches the 211 PSII default.
+
+The bulk path builds objects from per-type templates with the garbage
+collector paused, and adds them with one space.add() call. Both paths still
+build one pymunk Body and one Poly per shape, which sets the floor on setup
+time. Copying bodies from a template with copy.deepcopy was tried and is
+much slower than building them.
+
+A model takes about 190 MB per 1000 PSII-equivalents, so the 50,000 size
+needs about 10 GB of memory.
+
+Run from the repository root:
+    $ python -m benchmarks.spawner_setup
+"""
+import argparse
+from math import sqrt
+from time import perf_counter
+
+import numpy as np
+import pymunk
+
+from src.grana_model.objectdata import ObjectData
+from src.grana_model.psiistructure import PSIIStructure
+from src.grana_model.spawner import Spawner
+
+STRUCTURE_TYPES = ["C2S2M2", "C2S2M", "C2S2", "C2", "C1", "CP43"]
+STRUCTURE_P = [0.57, 0.17, 0.12, 0.09, 0.03, 0.02]
+
+
+def make_spawner(object_data: ObjectData, num_psii: int, seed: int) -> Spawner:
+    return Spawner(
+        object_data=object_data,
+        spawn_type="psii_secondary_noparticles",
+        shape_type="complex",
+        space=pymunk.Space(),
+        batch=None,
+        num_particles=0,
+        num_psii=num_psii,
+        spawn_seed=seed,
+    )
+
+
+def make_workload(spawner: Spawner, num_psii: int):
+    """types, positions and angles for num_psii PSII-equivalents"""
+    radius = 200 * sqrt(num_psii / 211)
+    num_secondary = int(spawner.ratio_free_LHC * num_psii)
+
+    obj_types = list(
+        spawner.rng.choice(STRUCTURE_TYPES, num_psii, p=STRUCTURE_P)
+    ) + ["cytb6f"] * num_secondary + ["LHCII"] * num_secondary
+    positions = spawner.random_pos_in_circle_array(
+        len(obj_types), max_radius=radius, center=(radius, radius)
+    )
+    angles = spawner.random_angles(len(obj_types))
+
+    return obj_types, positions, angles
+
+
+def time_per_object(spawner: Spawner, obj_types, positions, angles) -> float:
+    start = perf_counter()
+    for obj_type, pos, angle in zip(obj_types, positions.tolist(), angles):
+        PSIIStructure(
+            spawner.space,
+            spawner.object_data.type_dict[obj_type],
+            None,
+            spawner.shape_type,
+            pos=tuple(pos),
+            angle=angle,
+        )
+    return perf_counter() - start
+
+
+def time_bulk(spawner: Spawner, obj_types, positions, angles) -> float:
+    start = perf_counter()
+    spawner.spawn_bulk(obj_types, positions, angles)
+    return perf_counter() - start
+
+
+def main(sizes: list, seed: int, skip_per_object_above: int):
+    object_data = ObjectData(pos_csv_filename="082620_SEM_final_coordinates.csv")
+
+    print("psii_equivalents,objects,per_object_s,bulk_s,speedup")
+    for num_psii in sizes:
+        spawner = make_spawner(object_data, num_psii, seed)
+        workload = make_workload(spawner, num_psii)
+        bulk_s = time_bulk(spawner, *workload)
+
+        if num_psii > skip_per_object_above:
+            per_object_s = float("nan")
+        else:
+            spawner = make_spawner(object_data, num_psii, seed)
+            per_object_s = time_per_object(spawner, *workload)
+
+        print(
+            f"{num_psii},{len(workload[0])},{per_object_s:.3f},{bulk_s:.3f},"
+            f"{per_object_s / bulk_s:.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "-sizes",
+        type=int,
+        nargs="+",
+        default=[211, 1000, 5000, 10000, 50000],
+    )
+    parser.add_argument("-seed", type=int, default=1)
+    parser.add_argument(
+        "-skip_per_object_above",
+        help="only time the bulk path above this many PSII-equivalents",
+        type=int,
+        default=np.iinfo(np.int64).max,
+    )
+    args = parser.parse_args()
+    main(**vars(args))
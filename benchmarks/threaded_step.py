@@ -0,0 +1,81 @@
+"""
+benchmark of the time per space.step against solver thread count and object
+count, for sizing SLURM --cpus-per-task.
+
+Objects are spawned in a disc whose radius grows with the object count, so
+the packing density matches the 211 PSII default. pymunk's threaded solver
+uses at most 2 threads, so counts above 2 show where extra cores stop paying.
+
+Run from the repository root:
+    $ python -m benchmarks.threaded_step
+"""
+import argparse
+from math import sqrt
+from time import perf_counter
+
+from src.grana_model.collisionhandler import CollisionHandler
+from src.grana_model.objectdata import ObjectData
+from src.grana_model.simulationenv import SimulationEnvironment
+from src.grana_model.spawner import Spawner
+
+STRUCTURE_TYPES = ["C2S2M2", "C2S2M", "C2S2", "C2", "C1", "CP43"]
+STRUCTURE_P = [0.57, 0.17, 0.12, 0.09, 0.03, 0.02]
+
+
+def time_step(
+    object_data, num_psii, threads, iterations, num_steps, seed
+) -> float:
+    space = SimulationEnvironment._create_space(
+        threads=threads, iterations=iterations, collision_slop=0.1
+    )
+    CollisionHandler(space)
+    spawner = Spawner(
+        object_data=object_data,
+        shape_type="complex",
+        space=space,
+        batch=None,
+        spawn_type="psii_secondary_noparticles",
+        num_psii=num_psii,
+        spawn_seed=seed,
+    )
+    radius = 200 * sqrt(num_psii / 211)
+    num_secondary = int(spawner.ratio_free_LHC * num_psii)
+    obj_types = list(
+        spawner.rng.choice(STRUCTURE_TYPES, num_psii, p=STRUCTURE_P)
+    ) + ["cytb6f"] * num_secondary + ["LHCII"] * num_secondary
+    spawner.spawn_bulk(
+        obj_types,
+        spawner.random_pos_in_circle_array(
+            len(obj_types), max_radius=radius, center=(radius, radius)
+        ),
+        spawner.random_angles(len(obj_types)),
+    )
+
+    space.step(0.1)
+    start = perf_counter()
+    for _ in range(num_steps):
+        space.step(0.1)
+    return (perf_counter() - start) / num_steps
+
+
+def main(sizes, threads, iterations, num_steps, seed):
+    object_data = ObjectData(pos_csv_filename=None)
+
+    print("psii_equivalents,threads,iterations,ms_per_step")
+    for num_psii in sizes:
+        for num_threads in threads:
+            step_s = time_step(
+                object_data, num_psii, num_threads, iterations, num_steps, seed
+            )
+            print(f"{num_psii},{num_threads},{iterations},{step_s * 1e3:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-sizes", type=int, nargs="+", default=[211, 1000, 5000])
+    parser.add_argument("-threads", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("-iterations", type=int, default=10)
+    parser.add_argument("-num_steps", type=int, default=50)
+    parser.add_argument("-seed", type=int, default=1)
+    args = parser.parse_args()
+    main(**vars(args))
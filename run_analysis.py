@@ -0,0 +1,69 @@
+import argparse
+import csv
+from glob import glob
+
+from src.grana_model.analysis import PackingAnalysis, iter_frames
+
+
+def main(
+    inputs: list,
+    metrics_out: str,
+    rdf_out: str,
+    nn_max_distance: float = 40.0,
+    rdf_max_distance: float = 100.0,
+    rdf_bins: int = 100,
+):
+    paths = sorted(path for pattern in inputs for path in glob(pattern))
+    analysis = PackingAnalysis(
+        nn_max_distance=nn_max_distance,
+        rdf_max_distance=rdf_max_distance,
+        rdf_bins=rdf_bins,
+    )
+
+    with open(metrics_out, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=analysis.columns)
+        writer.writeheader()
+        for frame in iter_frames(paths):
+            writer.writerow(analysis.add_frame(frame))
+
+    r, g_r = analysis.radial_distribution()
+    with open(rdf_out, "w", newline="") as f:
+        write = csv.writer(f)
+        write.writerow(["r", "g_r"])
+        write.writerows(zip(r.round(3), g_r.round(5)))
+
+    print(f"analysed {analysis.num_frames} frames")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="computes packing metrics for exported coordinate files"
+    )
+
+    parser.add_argument(
+        "inputs",
+        help="exported coordinate csv files or glob patterns, e.g. 'output/*_data.csv'",
+        nargs="+",
+    )
+
+    parser.add_argument(
+        "-metrics_out",
+        help="per-frame metrics csv",
+        type=str,
+        default="packing_metrics.csv",
+    )
+
+    parser.add_argument(
+        "-rdf_out",
+        help="radial distribution function csv, accumulated over all frames",
+        type=str,
+        default="packing_rdf.csv",
+    )
+
+    parser.add_argument("-nn_max_distance", type=float, default=40.0)
+    parser.add_argument("-rdf_max_distance", type=float, default=100.0)
+    parser.add_argument("-rdf_bins", type=int, default=100)
+
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -0,0 +1,156 @@
+import argparse
+import csv
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+from pymunk import Poly
+
+from src.grana_model.domain import run_decomposed
+from src.grana_model.objectdata import ObjectData, ObjectDataExistingData
+
+
+def get_type_areas(type_dict: dict) -> dict:
+    """area of each object type, the sum of the areas of its compound shapes"""
+    return {
+        obj_type: sum(
+            Poly(None, coords).area for coords in obj_dict["shapes_compound"]
+        )
+        for obj_type, obj_dict in type_dict.items()
+    }
+
+
+def export_coordinates(job_id, obj_types, positions, angles, type_areas):
+    """writes the final coordinates in the same format as run_overlapagent"""
+    dt_string = datetime.now().strftime("%d%m%Y_%H%M%S")
+    filename = (
+        Path.cwd() / "output" / f"{dt_string}_jobid_{job_id}_decomposed_data.csv"
+    )
+
+    with open(filename, "w", newline="") as f:
+        write = csv.writer(f)
+        write.writerow(["type", "x", "y", "angle", "area"])
+        for obj_type, (x, y), angle in zip(obj_types, positions, angles):
+            write.writerow(
+                (
+                    obj_type,
+                    round(x, 2),
+                    round(y, 2),
+                    round(angle, 2),
+                    round(type_areas[obj_type], 2),
+                )
+            )
+
+
+def main(
+    slurm_job_id,
+    filename: str,
+    object_data_exists: bool = False,
+    tiles: list = (2, 2),
+    num_syncs: int = 10,
+    actions_per_sync: int = 500,
+    processes: int = None,
+    seed: int = 0,
+    proposal_stream: bool = False,
+):
+    if object_data_exists:
+        object_data = ObjectDataExistingData(filename, spawn_seed=seed)
+    else:
+        object_data = ObjectData(filename, spawn_seed=seed)
+
+    obj_list = list(object_data.object_list)
+    obj_types = [obj["obj_type"] for obj in obj_list]
+    positions = np.array([obj["pos"] for obj in obj_list], dtype=float)
+    angles = np.array([obj["angle"] for obj in obj_list], dtype=float)
+
+    start_time = perf_counter()
+    positions, angles, history = run_decomposed(
+        obj_types,
+        positions,
+        angles,
+        tiles=tuple(tiles),
+        num_syncs=num_syncs,
+        actions_per_sync=actions_per_sync,
+        processes=processes,
+        seed=seed,
+        proposal_stream=proposal_stream,
+    )
+    wall_time = perf_counter() - start_time
+
+    for sync_num, overlap_begin, overlap_end in history:
+        print(f"sync {sync_num}: overlap {overlap_begin:.2f} -> {overlap_end:.2f}")
+    print(
+        f"{num_syncs * actions_per_sync * tiles[0] * tiles[1] / wall_time:.1f}"
+        " actions/s"
+    )
+
+    export_coordinates(
+        slurm_job_id,
+        obj_types,
+        positions.tolist(),
+        angles.tolist(),
+        get_type_areas(object_data.type_dict),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="launches a domain-decomposed overlap agent run"
+    )
+
+    parser.add_argument("-slurm_job_id", help="job array number for SLURM run")
+
+    parser.add_argument(
+        "-filename",
+        help="filename of csv position datafile in res/grana_coordinates/",
+        type=str,
+        default="082620_SEM_final_coordinates.csv",
+    )
+
+    parser.add_argument(
+        "-object_data_exists",
+        help="load xy, object type, angle from the datafile instead of generating new object types for the XY coordinates",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-tiles",
+        help="number of tiles along x and y, one worker process per tile",
+        type=int,
+        nargs=2,
+        default=[2, 2],
+    )
+
+    parser.add_argument(
+        "-num_syncs",
+        help="number of times the tiles exchange halo objects",
+        type=int,
+        default=10,
+    )
+
+    parser.add_argument(
+        "-actions_per_sync",
+        help="actions each tile performs between sync points",
+        type=int,
+        default=500,
+    )
+
+    parser.add_argument(
+        "-processes",
+        help="size of the worker pool, defaults to one per tile",
+        type=int,
+        default=None,
+    )
+
+    parser.add_argument("-seed", type=int, default=0)
+
+    parser.add_argument(
+        "-proposal_stream",
+        help="draw each tile's actions from its own numpy generator, spawned from -seed",
+        action="store_true",
+    )
+
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -0,0 +1,63 @@
+"""
+pre-ingests coordinate files into the binary cache
+
+Converts every coordinate csv in a directory into the cached .npy arrays that
+ObjectData loads, on a process pool, so the jobs of a sweep start from the
+cache instead of each parsing the csv files the first time.
+
+Example:
+    $ python run_ingest.py -directory output/ -pattern "*_data.csv" -processes 8
+"""
+import argparse
+from time import perf_counter
+
+from src.grana_model.coordcache import DEFAULT_CACHE_DIR, ingest_directory
+
+
+def main(directory: str, pattern: str, cache_dir: str, processes: int):
+    start = perf_counter()
+    digests = ingest_directory(
+        directory, cache_dir=cache_dir, pattern=pattern, processes=processes
+    )
+    print(
+        f"ingested {len(digests)} files into {cache_dir} "
+        f"in {perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="converts coordinate csv files into the binary cache"
+    )
+
+    parser.add_argument(
+        "-directory",
+        help="directory of coordinate csv files",
+        type=str,
+        default="src/grana_model/res/grana_coordinates/",
+    )
+
+    parser.add_argument(
+        "-pattern",
+        help="glob pattern of the files to ingest",
+        type=str,
+        default="*.csv",
+    )
+
+    parser.add_argument(
+        "-cache_dir",
+        help="cache directory, ObjectData reads from res/cache/",
+        type=str,
+        default=DEFAULT_CACHE_DIR,
+    )
+
+    parser.add_argument(
+        "-processes",
+        help="size of the worker pool, defaults to the number of cores",
+        type=int,
+        default=None,
+    )
+
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -0,0 +1,296 @@
+"""
+local job service for overlap agent runs
+
+Stands in for the cluster scheduler on a shared workstation: jobs are queued
+and run on a bounded process pool instead of everyone starting
+run_overlapagent.py by hand. Clients talk to the service over a Unix socket
+(or TCP) with one JSON object per line.
+
+Requests:
+    {"op": "submit", "filename": str, "num_loops": int,
+     "actions_per_zone": int, "seed": int, "object_data_exists": bool}
+    {"op": "watch", "job_id": int}  streams progress until the job finishes
+    {"op": "cancel", "job_id": int}
+    {"op": "list"}
+
+Example:
+    $ python run_jobservice.py serve -max_workers 4
+    $ python run_jobservice.py submit -filename 082620_SEM_final_coordinates.csv -num_loops 10
+    $ python run_jobservice.py watch -job_id 1
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import queue
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+from run_overlapagent import main as run_overlap_agent
+
+DEFAULT_SOCKET = "/tmp/grana_jobservice.sock"
+FINISHED_STATES = ["done", "failed", "cancelled"]
+
+
+class JobCancelled(Exception):
+    """raised inside a worker to stop a job that has been cancelled"""
+
+
+def _run_job(job_id: int, spec: dict, progress_queue, cancelled):
+    """worker process entry point: runs one job, reporting each step"""
+
+    def on_step(progress: dict):
+        progress_queue.put((job_id, progress))
+        if cancelled.get(job_id, False):
+            raise JobCancelled(job_id)
+
+    progress_queue.put((job_id, {"state": "running"}))
+    run_overlap_agent(
+        slurm_job_id=f"svc{job_id}",
+        filename=spec["filename"],
+        num_loops=spec["num_loops"],
+        object_data_exists=spec["object_data_exists"],
+        actions_per_zone=spec["actions_per_zone"],
+        seed=spec["seed"],
+        on_step=on_step,
+    )
+
+
+class Job:
+    def __init__(self, job_id: int, spec: dict):
+        self.job_id = job_id
+        self.spec = spec
+        self.state = "queued"
+        self.last_progress = {}
+        self.future = None
+        self.watchers = []
+
+    def describe(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "spec": self.spec,
+            "progress": self.last_progress,
+        }
+
+    def publish(self, message: dict):
+        for watcher in self.watchers:
+            watcher.put_nowait(message)
+
+
+class JobService:
+    """accepts jobs from clients and runs them on a bounded process pool"""
+
+    def __init__(self, max_workers: int):
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        self.manager = multiprocessing.Manager()
+        self.progress_queue = self.manager.Queue()
+        self.cancelled = self.manager.dict()
+        self.jobs = {}
+        self.next_job_id = 1
+        self.running = True
+
+    async def serve(self, socket_path: str = None, port: int = None):
+        if port is not None:
+            server = await asyncio.start_server(
+                self.handle_client, "127.0.0.1", port
+            )
+        else:
+            server = await asyncio.start_unix_server(
+                self.handle_client, socket_path
+            )
+
+        pump = asyncio.create_task(self.pump_progress())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.running = False
+            await pump
+            self.executor.shutdown(cancel_futures=True)
+            self.manager.shutdown()
+
+    async def pump_progress(self):
+        """moves progress messages from the worker processes to the jobs"""
+        loop = asyncio.get_running_loop()
+        while self.running:
+            try:
+                job_id, progress = await loop.run_in_executor(
+                    None, self.progress_queue.get, True, 0.5
+                )
+            except queue.Empty:
+                continue
+
+            job = self.jobs[job_id]
+            # on_step's "job_id" is the run's string id, not the service's
+            progress.pop("job_id", None)
+            if job.state in FINISHED_STATES:
+                # wait_for can finish a job before its last messages are
+                # read, they must not flip it back to running or hide an error
+                if job.state == "done" and "state" not in progress:
+                    job.last_progress = progress
+                continue
+            if progress.get("state") == "running":
+                job.state = "running"
+            else:
+                job.last_progress = progress
+            job.publish({**progress, "job_id": job_id, "state": job.state})
+
+    def submit(self, request: dict) -> Job:
+        spec = {
+            "filename": request.get(
+                "filename", "082620_SEM_final_coordinates.csv"
+            ),
+            "num_loops": int(request.get("num_loops", 100)),
+            "actions_per_zone": int(request.get("actions_per_zone", 500)),
+            "seed": int(request.get("seed", 0)),
+            "object_data_exists": bool(
+                request.get("object_data_exists", False)
+            ),
+        }
+        job = Job(self.next_job_id, spec)
+        self.next_job_id += 1
+        self.jobs[job.job_id] = job
+
+        job.future = self.executor.submit(
+            _run_job, job.job_id, spec, self.progress_queue, self.cancelled
+        )
+        asyncio.create_task(self.wait_for(job))
+        return job
+
+    async def wait_for(self, job: Job):
+        try:
+            await asyncio.wrap_future(job.future)
+            job.state = "done"
+        except (JobCancelled, CancelledError):
+            job.state = "cancelled"
+        except Exception as exc:
+            job.state = "failed"
+            job.last_progress = {"error": repr(exc)}
+        job.publish(job.describe())
+
+    def cancel(self, job: Job):
+        """queued jobs are dropped from the pool, running jobs stop at the
+        end of their current step"""
+        if job.state in FINISHED_STATES:
+            return
+        if not job.future.cancel():
+            self.cancelled[job.job_id] = True
+
+    async def handle_client(self, reader, writer):
+        async def send(message: dict):
+            writer.write((json.dumps(message) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    op = request["op"]
+                    job = (
+                        self.jobs[int(request["job_id"])]
+                        if "job_id" in request
+                        else None
+                    )
+                except (ValueError, KeyError) as exc:
+                    await send({"error": f"bad request: {exc!r}"})
+                    continue
+
+                if op == "submit":
+                    await send(self.submit(request).describe())
+                elif op == "list":
+                    await send(
+                        {"jobs": [j.describe() for j in self.jobs.values()]}
+                    )
+                elif op == "cancel" and job is not None:
+                    self.cancel(job)
+                    await send(job.describe())
+                elif op == "watch" and job is not None:
+                    await self.watch(job, send)
+                else:
+                    await send({"error": f"unknown op: {op}"})
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def watch(self, job: Job, send):
+        await send(job.describe())
+        if job.state in FINISHED_STATES:
+            return
+
+        watcher = asyncio.Queue()
+        job.watchers.append(watcher)
+        try:
+            while True:
+                message = await watcher.get()
+                await send(message)
+                if message["state"] in FINISHED_STATES:
+                    return
+        finally:
+            job.watchers.remove(watcher)
+
+
+async def client(request: dict, socket_path: str = None, port: int = None):
+    """sends one request and prints every response line"""
+    if port is not None:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    else:
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+
+    writer.write((json.dumps(request) + "\n").encode())
+    await writer.drain()
+
+    while line := await reader.readline():
+        message = json.loads(line)
+        print(json.dumps(message))
+        if request["op"] != "watch" or message.get("state") in FINISHED_STATES:
+            break
+
+    writer.close()
+    await writer.wait_closed()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="local job service for overlap agent runs"
+    )
+    parser.add_argument(
+        "op", choices=["serve", "submit", "watch", "cancel", "list"]
+    )
+    parser.add_argument("-socket", type=str, default=DEFAULT_SOCKET)
+    parser.add_argument(
+        "-port", help="listen on localhost TCP instead", type=int, default=None
+    )
+    parser.add_argument(
+        "-max_workers",
+        help="number of jobs that may run at once",
+        type=int,
+        default=max(1, multiprocessing.cpu_count() // 2),
+    )
+    parser.add_argument("-job_id", type=int, default=None)
+    parser.add_argument(
+        "-filename", type=str, default="082620_SEM_final_coordinates.csv"
+    )
+    parser.add_argument("-num_loops", type=int, default=100)
+    parser.add_argument("-actions_per_zone", type=int, default=500)
+    parser.add_argument("-seed", type=int, default=0)
+    parser.add_argument("-object_data_exists", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.op == "serve":
+        service = JobService(max_workers=args.max_workers)
+        asyncio.run(service.serve(socket_path=args.socket, port=args.port))
+    else:
+        request = {"op": args.op}
+        if args.job_id is not None:
+            request["job_id"] = args.job_id
+        if args.op == "submit":
+            request.update(
+                filename=args.filename,
+                num_loops=args.num_loops,
+                actions_per_zone=args.actions_per_zone,
+                seed=args.seed,
+                object_data_exists=args.object_data_exists,
+            )
+        asyncio.run(client(request, socket_path=args.socket, port=args.port))
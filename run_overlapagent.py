@@ -1,11 +1,23 @@
 import argparse
 import csv
+import os
+import random
+import socket
 from datetime import datetime
 from pathlib import Path
-from time import process_time
+from time import perf_counter, process_time, sleep
 
+from src.grana_model.coordexport import AsyncCoordinateExporter, ExportPolicy
+from src.grana_model.metrics import MetricsExporter
+from src.grana_model.objectdata import load_type_dict
+from src.grana_model.overlaparea import OverlapAreaObjective
+from src.grana_model.overlapmap import OverlapMap
 from src.grana_model.overlapagent import OverlapAgent, Rings
+from src.grana_model.profiler import SamplingProfiler
+from src.grana_model.proposals import ProposalStream
+from src.grana_model.relaxation import CollectiveRelaxation
 from src.grana_model.simulationenv import SimulationEnvironment
+from src.grana_model.workqueue import WorkQueue
 
 
 def write_to_log(log_path: str, row_data: list, mode: str = "a"):
@@ -22,29 +34,22 @@ def get_log_path(job_id: int):
     return Path.cwd() / "log" / f"{dt_string}_{job_id}.csv"
 
 
-def export_coordinates(job_id, step_num, zone_list, mean_overlap):
+def get_export_path(job_id, step_num, mean_overlap):
+    """uses the job_id, step and date to create the coordinate output file"""
     now = datetime.now()
     dt_string = now.strftime("%d%m%Y_%H%M%S")
-    filename = (
+    return (
         Path.cwd()
         / "output"
         / f"{dt_string}_jobid_{job_id}_step_{step_num}_overlap_{int(mean_overlap)}_data.csv"
     )
 
-    with open(filename, "w", newline="") as f:
-        write = csv.writer(f)
-        # write the headers
-        write.writerow(["type", "x", "y", "angle", "area"])
-        for object in zone_list:
-            write.writerow(
-                (
-                    object.type,
-                    round(object.body.position[0], 2),
-                    round(object.body.position[1], 2),
-                    round(object.body.angle, 2),
-                    round(object.area, 2),
-                )
-            )
+
+def get_profile_path(job_id: str):
+    """uses the job_id and date to create the collapsed stack output file"""
+    now = datetime.now()
+    dt_string = now.strftime("%d%m%Y_%H%M%S")
+    return Path.cwd() / "profile" / f"{dt_string}_{job_id}.collapsed"
 
 
 def get_overlap_reduction_percent(overlap_begin, overlap_end):
@@ -60,16 +65,62 @@ def main(
     num_loops: int = 100,
     object_data_exists: bool = False,
     actions_per_zone: int = 500,
+    seed: int = 0,
+    on_step=None,
+    type_dict: dict = None,
+    export: bool = True,
+    scoring: str = "step",
+    threads: int = 1,
+    iterations: int = 10,
+    collision_slop: float = 0.1,
+    freeze_margin: float = None,
+    spatial_index: str = "bbtree",
+    spatial_index_benchmark: bool = False,
+    relax_iterations: int = 0,
+    report_overlap_area: bool = False,
+    proposal_stream: bool = False,
+    metrics_textfile: str = None,
+    metrics_port: int = None,
+    metrics_interval: float = 10.0,
+    profile: bool = False,
+    profile_interval: float = 0.005,
+    export_every: int = 1,
+    export_on_best: bool = False,
+    export_interval: float = 0.0,
+    export_queue_size: int = 4,
+    best_of_k: int = 1,
+    overlap_map: bool = False,
+    overlap_map_resolution: int = 50,
 ):
+    """runs the overlap agent for num_loops steps. If on_step is given it is
+    called after every step with a dict of that step's progress. A preloaded
+    type_dict can be passed in to skip loading the shape data. Returns a dict
+    summarising the run"""
+    wall_start = perf_counter()
     job_id = str(slurm_job_id)
+    profiler = None
+    if profile:
+        profiler = SamplingProfiler(interval=profile_interval)
+        profiler.start()
     # print(f"job_id={job_id}")
+    if seed != 0:
+        random.seed(seed)
+
     sim_env = SimulationEnvironment(
         # pos_csv_filename="16102021_083647_5_overlap_66_data.csv",
         pos_csv_filename=filename,
         object_data_exists=object_data_exists,
+        spawn_seed=seed,
+        type_dict=type_dict,
+        threads=threads,
+        iterations=iterations,
+        collision_slop=collision_slop,
     )
 
-    object_list, _ = sim_env.spawner.setup_model()
+    object_list, _ = sim_env.setup_model()
+    sim_env.tune_spatial_index(
+        object_list, mode=spatial_index, benchmark=spatial_index_benchmark
+    )
 
     overlap_agent = OverlapAgent(
         object_list=object_list,
@@ -77,9 +128,57 @@ def main(
         collision_handler=sim_env.collision_handler,
         space=sim_env.space,
         job_id=job_id,
+        scoring=scoring,
+        freeze_margin=freeze_margin,
+        proposals=(
+            ProposalStream(seed=seed if seed != 0 else None)
+            if proposal_stream
+            else None
+        ),
+        best_of_k=best_of_k,
     )
 
     _init_overlap = overlap_agent._update_space()
+    overlap_agent.overlap_distance = _init_overlap
+
+    if relax_iterations > 0:
+        # collective relaxation does the bulk of the work, the agent polishes
+        CollectiveRelaxation(
+            space=sim_env.space,
+            object_list=object_list,
+            collision_handler=sim_env.collision_handler,
+        ).run(max_iterations=relax_iterations)
+        overlap_agent.overlap_distance = overlap_agent._update_space()
+
+    exporter = None
+    if export:
+        # steps are written on a background thread, from a snapshot
+        exporter = AsyncCoordinateExporter(
+            object_list,
+            policy=ExportPolicy(
+                every=export_every,
+                on_best=export_on_best,
+                min_interval=export_interval,
+            ),
+            queue_size=export_queue_size,
+        )
+
+    area_objective = None
+    if report_overlap_area and export:
+        area_objective = (
+            overlap_agent.geometry_scorer
+            if scoring == "area"
+            else OverlapAreaObjective(object_list)
+        )
+
+    object_overlap_map = None
+    if overlap_map and export:
+        object_overlap_map = OverlapMap(
+            object_list, resolution=overlap_map_resolution
+        )
+        if scoring == "step":
+            # filled by every evaluation of the agent
+            sim_env.collision_handler.overlap_map = object_overlap_map
 
     log_path = get_log_path(str(job_id))
     # print(f"log_path: {log_path}")
@@ -95,9 +194,22 @@ def main(
             "overlap_pct",
             "overlap",
             "process_time",
+            "spatial_index",
         ],
     )
 
+    metrics = None
+    if metrics_textfile is not None or metrics_port is not None:
+        metrics = MetricsExporter(
+            overlap_agent,
+            job_id,
+            textfile=metrics_textfile,
+            port=metrics_port,
+            interval=metrics_interval,
+            num_steps=num_loops,
+        )
+        metrics.start()
+
     for step_num in range(0, num_loops):
         start_time = process_time()
 
@@ -105,6 +217,11 @@ def main(
             num_actions=actions_per_zone, step_num=step_num
         )
 
+        step_time = round(process_time() - start_time, 3)
+        if metrics is not None:
+            metrics.record_step(step_num, step_time)
+        overlap_pct = get_overlap_reduction_percent(overlap_begin, overlap_end)
+
         write_to_log(
             log_path=log_path,
             mode="a",
@@ -116,13 +233,134 @@ def main(
                     overlap_agent.num_actions
                     * overlap_agent.area_strategy.total_zones
                 ),
-                get_overlap_reduction_percent(overlap_begin, overlap_end),
+                overlap_pct,
                 overlap_end,
-                round(process_time() - start_time, 3),
+                step_time,
+                sim_env.spatial_index,
             ],
         )
 
-        export_coordinates(job_id, step_num, object_list_p, overlap_end)
+        # exports are decided and named by the same overlap as the summary
+        # and the best state, not run()'s rough average
+        if exporter is not None and exporter.policy.should_export(
+            step_num, overlap_agent.overlap_distance
+        ):
+            if object_overlap_map is not None and scoring != "step":
+                object_overlap_map.measure(sim_env.space)
+            exporter.submit(
+                get_export_path(
+                    job_id, step_num, overlap_agent.overlap_distance
+                ),
+                object_list_p,
+                overlap_area=(
+                    None
+                    if area_objective is None
+                    else area_objective.per_object_overlap()
+                ),
+                overlap_map=object_overlap_map,
+            )
+
+        if on_step is not None:
+            on_step(
+                {
+                    "job_id": job_id,
+                    "step_num": step_num,
+                    "num_loops": num_loops,
+                    "overlap_pct": overlap_pct,
+                    "overlap": overlap_end,
+                    "process_time": step_time,
+                }
+            )
+
+    # run() returns a rough average of its last actions, the summary uses
+    # the agent's own running overlap, comparable with _init_overlap
+    final_overlap = overlap_agent.overlap_distance
+    best_overlap = overlap_agent.restore_best()
+    if metrics is not None:
+        metrics.stop()
+    if exporter is not None:
+        if object_overlap_map is not None and scoring != "step":
+            object_overlap_map.measure(sim_env.space)
+        exporter.submit(
+            get_export_path(job_id, "best", best_overlap),
+            object_list,
+            overlap_area=(
+                None
+                if area_objective is None
+                else area_objective.per_object_overlap()
+            ),
+            overlap_map=object_overlap_map,
+        )
+        exporter.close()
+
+    if profiler is not None:
+        profiler.stop()
+        profiler.write(get_profile_path(job_id))
+
+    wall_time = perf_counter() - wall_start
+    total_actions = (
+        num_loops * actions_per_zone * overlap_agent.area_strategy.total_zones
+    )
+
+    return {
+        "job_id": job_id,
+        "initial_overlap": _init_overlap,
+        "final_overlap": final_overlap,
+        "best_overlap": best_overlap,
+        "overlap_reduction_pct": get_overlap_reduction_percent(
+            _init_overlap, final_overlap
+        ),
+        "total_actions": total_actions,
+        "actions_per_sec": round(total_actions / wall_time, 2),
+        "wall_time": round(wall_time, 3),
+    }
+
+
+def work(
+    work_queue: str,
+    worker_id: str = None,
+    lease_seconds: float = 300.0,
+    **kwargs,
+):
+    """worker mode: claims units from the work queue in the work_queue
+    directory and runs each until the queue is empty, waiting on units
+    leased by other workers in case they die. A unit's parameters,
+    usually filename and seed, override kwargs, the other main() arguments.
+    Returns the number of units this worker finished"""
+    queue = WorkQueue(work_queue, lease_seconds=lease_seconds)
+    if worker_id is None:
+        worker_id = f"{socket.gethostname()}_{os.getpid()}"
+    kwargs.pop("slurm_job_id", None)
+    if kwargs.get("type_dict") is None:
+        # loaded once and shared by every unit
+        kwargs["type_dict"] = load_type_dict()
+
+    num_done = 0
+    while queue.unit_ids("todo"):
+        lease = queue.claim(worker_id)
+        if lease is None:
+            # the rest are leased by other workers, keep polling in case one
+            # of them dies and its lease expires
+            sleep(queue.heartbeat_interval)
+            continue
+        with lease:
+            try:
+                summary = main(
+                    slurm_job_id=lease.unit_id, **{**kwargs, **lease.params}
+                )
+            except Exception as e:
+                if lease.fail(repr(e)):
+                    print(f"{worker_id}: {lease.unit_id} failed: {e!r}")
+                continue
+            if not lease.complete(summary):
+                print(f"{worker_id}: {lease.unit_id} lease lost, not recorded")
+                continue
+        num_done += 1
+        print(
+            f"{worker_id}: {lease.unit_id} done, overlap "
+            f"{summary['initial_overlap']:.2f} -> {summary['final_overlap']:.2f}"
+        )
+    return num_done
 
 
 if __name__ == "__main__":
@@ -160,6 +398,190 @@ if __name__ == "__main__":
         default=500,
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "-seed",
+        help="seed for object generation and agent actions, 0 for unseeded",
+        type=int,
+        default=0,
+    )
+
+    parser.add_argument(
+        "-scoring",
+        help="step: score actions with a physics step. geometry: score from shape geometry only, without integration. area: score the exact overlap area of the shapes",
+        type=str,
+        choices=["step", "geometry", "area"],
+        default="step",
+    )
+
+    parser.add_argument(
+        "-threads",
+        help="solver threads for space.step, pymunk uses at most 2 (Linux/macOS only)",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "-iterations",
+        help="solver iterations per space.step",
+        type=int,
+        default=10,
+    )
+
+    parser.add_argument(
+        "-collision_slop",
+        help="amount of overlap between shapes that is allowed",
+        type=float,
+        default=0.1,
+    )
+
+    parser.add_argument(
+        "-freeze_margin",
+        help="make bodies further than this outside the active zone static while it runs",
+        type=float,
+        default=None,
+    )
+
+    parser.add_argument(
+        "-spatial_index",
+        help="bbtree: pymunk default. hash: spatial hash sized from the shapes. auto: choose from the shape sizes",
+        type=str,
+        choices=["bbtree", "hash", "auto"],
+        default="bbtree",
+    )
+
+    parser.add_argument(
+        "-spatial_index_benchmark",
+        help="with -spatial_index auto, time the candidates at startup and use the fastest",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-relax_iterations",
+        help="collective relaxation iterations to run before the overlap agent",
+        type=int,
+        default=0,
+    )
+
+    parser.add_argument(
+        "-report_overlap_area",
+        help="add the exact overlap area of each object to the exported coordinates",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-proposal_stream",
+        help="draw the agent's actions in blocks from a numpy generator seeded with -seed",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-metrics_textfile",
+        help="write live metrics to this Prometheus textfile collector file",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "-metrics_port",
+        help="serve live metrics over http on this local port",
+        type=int,
+        default=None,
+    )
+
+    parser.add_argument(
+        "-metrics_interval",
+        help="seconds between live metrics samples",
+        type=float,
+        default=10.0,
+    )
+
+    parser.add_argument(
+        "-profile",
+        help="sample the stack while the job runs and write collapsed stacks to profile/",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-profile_interval",
+        help="seconds between profiler samples",
+        type=float,
+        default=0.005,
+    )
+
+    parser.add_argument(
+        "-export_every",
+        help="export the coordinates of every Nth step",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "-export_on_best",
+        help="only export steps with a lower overlap than any exported before",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-export_interval",
+        help="minimum seconds between coordinate exports",
+        type=float,
+        default=0.0,
+    )
+
+    parser.add_argument(
+        "-export_queue_size",
+        help="exported steps waiting to be written before the agent waits",
+        type=int,
+        default=4,
+    )
+
+    parser.add_argument(
+        "-best_of_k",
+        help="with -scoring area, score this many candidate moves per action and keep the best",
+        type=int,
+        default=1,
+    )
+
+    parser.add_argument(
+        "-overlap_map",
+        help="export per-object overlap, an overlap heatmap and a type pair overlap matrix with each step",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-overlap_map_resolution",
+        help="heatmap cells along each side of the -50 to 450 square",
+        type=int,
+        default=50,
+    )
+
+    parser.add_argument(
+        "-work_queue",
+        help="shared queue directory from run_workqueue.py, runs as a worker that takes filename and seed from the queue until it is empty",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "-worker_id",
+        help="worker name recorded with its results, defaults to host_pid",
+        type=str,
+        default=None,
+    )
+
+    parser.add_argument(
+        "-lease_seconds",
+        help="seconds without a heartbeat before another worker takes over a unit",
+        type=float,
+        default=300.0,
+    )
+
+    args = vars(parser.parse_args())
+    work_queue = args.pop("work_queue")
+    worker_id = args.pop("worker_id")
+    lease_seconds = args.pop("lease_seconds")
 
-    main(**vars(args))
+    if work_queue is not None:
+        work(work_queue, worker_id, lease_seconds, **args)
+    else:
+        main(**args)
@@ -0,0 +1,148 @@
+"""
+particle diffusion run
+
+Spawns PSII and secondary structures from a coordinate file, fills the grana
+disc with a vectorized ParticleEngine and lets the particles diffuse around
+the structures for num_steps timesteps.
+
+With -stats the mean squared displacement and first passage times are
+recorded as the run goes, with a StatsRecorder, and written to
+output/{date}_{job_id}_msd.csv and output/{date}_{job_id}_fpt.csv at the end,
+and every -stats_every steps if it is set.
+
+Example:
+    $ python run_particles.py -job_id 1 -num_particles 100000 -num_steps 10000 -stats
+"""
+import argparse
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+from src.grana_model.particlestats import StatsRecorder
+from src.grana_model.simulationenv import SimulationEnvironment
+
+
+def get_stats_prefix(job_id):
+    """uses the job_id and date to create the prefix of the stats files"""
+    now = datetime.now()
+    dt_string = now.strftime("%d%m%Y_%H%M%S")
+    return Path.cwd() / "output" / f"{dt_string}_{job_id}"
+
+
+def main(
+    job_id,
+    filename: str,
+    object_data_exists: bool = False,
+    num_particles: int = 10000,
+    num_steps: int = 1000,
+    step_sigma: float = 1.0,
+    seed: int = 0,
+    stats: bool = False,
+    stats_every: int = 0,
+    radii: list = (5.0, 10.0, 20.0, 40.0),
+) -> dict:
+    """runs num_steps particle timesteps and returns a dict summarising the
+    run"""
+    wall_start = perf_counter()
+    sim_env = SimulationEnvironment(
+        pos_csv_filename=filename,
+        object_data_exists=object_data_exists,
+        spawn_seed=seed,
+    )
+    sim_env.spawner.spawn_type = "psii_secondary"
+    sim_env.spawner.particle_mode = "engine"
+    sim_env.spawner.num_particles = num_particles
+    _, engine = sim_env.setup_model()
+    engine.step_sigma = step_sigma
+
+    recorder = None
+    if stats:
+        recorder = StatsRecorder(
+            engine,
+            radii=radii,
+            out_prefix=str(get_stats_prefix(job_id)),
+            export_every=stats_every,
+            max_time=num_steps,
+        )
+
+    engine.step(num_steps=num_steps, callback=recorder)
+
+    if recorder is not None:
+        recorder.export()
+
+    wall_time = perf_counter() - wall_start
+    return {
+        "job_id": str(job_id),
+        "num_particles": len(engine),
+        "num_steps": engine.time,
+        "acceptance": round(
+            engine.accepted_moves / max(1, len(engine) * engine.time), 4
+        ),
+        "wall_time": round(wall_time, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="runs a particle diffusion")
+
+    parser.add_argument("-job_id", help="job array number for SLURM run")
+
+    parser.add_argument(
+        "-filename",
+        help="filename of csv position datafile in res/grana_coordinates/",
+        type=str,
+        default="082620_SEM_final_coordinates.csv",
+    )
+
+    parser.add_argument(
+        "-object_data_exists",
+        help="load xy, object type, angle from the datafile instead of generating new object types for the XY coordinates",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-num_particles", help="number of particles", type=int, default=10000
+    )
+
+    parser.add_argument(
+        "-num_steps", help="number of timesteps", type=int, default=1000
+    )
+
+    parser.add_argument(
+        "-step_sigma",
+        help="standard deviation of each displacement component per timestep",
+        type=float,
+        default=1.0,
+    )
+
+    parser.add_argument(
+        "-seed",
+        help="seed for the structures and the particles, 0 for a random run",
+        type=int,
+        default=0,
+    )
+
+    parser.add_argument(
+        "-stats",
+        help="record the msd and first passage times and write them to output/",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "-stats_every",
+        help="also write the stats every this many steps, 0 for only at the end",
+        type=int,
+        default=0,
+    )
+
+    parser.add_argument(
+        "-radii",
+        help="first passage radii",
+        type=float,
+        nargs="+",
+        default=[5.0, 10.0, 20.0, 40.0],
+    )
+
+    args = parser.parse_args()
+
+    print(main(**vars(args)))
@@ -0,0 +1,53 @@
+"""
+merges the sampling profiles of many overlap agent jobs
+
+Adds up the collapsed stack files that run_overlapagent.py -profile writes,
+for example one per SLURM array task, into one collapsed file ready for
+flamegraph.pl or speedscope, and prints how the samples split between
+space.step, the collision callbacks, geometry scoring, proposal generation,
+export and everything else.
+
+Example:
+    $ python run_profile_merge.py "profile/*.collapsed" -out merged.collapsed
+    $ flamegraph.pl merged.collapsed > merged.svg
+"""
+import argparse
+from glob import glob
+
+from src.grana_model.profiler import attribute, merge_collapsed, write_collapsed
+
+
+def main(inputs: list, out: str):
+    paths = sorted(path for pattern in inputs for path in glob(pattern))
+    stacks = merge_collapsed(paths)
+    write_collapsed(stacks, out)
+
+    totals = attribute(stacks)
+    num_samples = sum(totals.values())
+    print(f"merged {len(paths)} profiles, {num_samples} samples")
+    print("category,samples,pct")
+    for category, count in totals.most_common():
+        print(f"{category},{count},{count / num_samples * 100:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="merges collapsed stack profiles from many jobs"
+    )
+
+    parser.add_argument(
+        "inputs",
+        help="collapsed stack files or glob patterns, e.g. 'profile/*.collapsed'",
+        nargs="+",
+    )
+
+    parser.add_argument(
+        "-out",
+        help="merged collapsed stack file",
+        type=str,
+        default="merged.collapsed",
+    )
+
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -0,0 +1,136 @@
+"""
+renders exported coordinate files into movie frames without a display
+
+Draws every step exported by run_overlapagent.py as an image on a process
+pool and writes numbered frames, in step order, that ffmpeg turns into a
+movie:
+    $ python run_render.py "output/*_jobid_123_step_*_data.csv" -out_dir frames
+    $ ffmpeg -i frames/frame_%05d.png -pix_fmt yuv420p movie.mp4
+
+With -format raw the frames are raw rgb24 files instead, which skip the png
+compression:
+    $ cat frames/*.rgb | ffmpeg -f rawvideo -pix_fmt rgb24 -s 800x800 -i - movie.mp4
+"""
+import argparse
+import re
+from glob import glob
+from multiprocessing import Pool
+from pathlib import Path
+
+from src.grana_model.analysis import read_frame
+from src.grana_model.objectdata import load_type_dict
+from src.grana_model.render import FrameRenderer, write_png, write_raw
+
+# per worker process renderer, built once by _init_worker
+_RENDERER = None
+
+
+def step_order(path: str):
+    """sorts exported steps by step number, with the best step last"""
+    match = re.search(r"_step_(\d+)_", Path(path).name)
+    return (0, int(match.group(1)), path) if match else (1, 0, path)
+
+
+def _init_worker(bounds, scale, shape_type):
+    global _RENDERER
+    _RENDERER = FrameRenderer(
+        load_type_dict(), bounds=bounds, scale=scale, shape_type=shape_type
+    )
+
+
+def _render_one(job: tuple) -> str:
+    frame_num, path, out_dir, image_format = job
+    image = _RENDERER.render(read_frame(path))
+    if image_format == "png":
+        out_path = Path(out_dir) / f"frame_{frame_num:05d}.png"
+        write_png(out_path, image)
+    else:
+        out_path = Path(out_dir) / f"frame_{frame_num:05d}.rgb"
+        write_raw(out_path, image)
+    return str(out_path)
+
+
+def main(
+    inputs: list,
+    out_dir: str,
+    image_format: str,
+    bounds: list,
+    scale: float,
+    shape_type: str,
+    processes: int,
+):
+    paths = sorted(
+        {path for pattern in inputs for path in glob(pattern)}, key=step_order
+    )
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    jobs = [
+        (frame_num, path, out_dir, image_format)
+        for frame_num, path in enumerate(paths)
+    ]
+
+    with Pool(
+        processes=processes,
+        initializer=_init_worker,
+        initargs=(tuple(bounds), scale, shape_type),
+    ) as pool:
+        for num_done, _ in enumerate(
+            pool.imap_unordered(_render_one, jobs, chunksize=4), start=1
+        ):
+            if num_done % 100 == 0 or num_done == len(jobs):
+                print(f"rendered {num_done}/{len(jobs)} frames")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="renders exported coordinate files into movie frames"
+    )
+
+    parser.add_argument(
+        "inputs",
+        help="exported coordinate csv files or glob patterns, e.g. 'output/*_data.csv'",
+        nargs="+",
+    )
+
+    parser.add_argument(
+        "-out_dir", help="directory for the frames", type=str, default="frames"
+    )
+
+    parser.add_argument(
+        "-format",
+        dest="image_format",
+        help="png: numbered png files. raw: numbered raw rgb24 files",
+        type=str,
+        choices=["png", "raw"],
+        default="png",
+    )
+
+    parser.add_argument(
+        "-bounds",
+        help="x_min y_min x_max y_max of the area drawn",
+        type=float,
+        nargs=4,
+        default=[0.0, 0.0, 400.0, 400.0],
+    )
+
+    parser.add_argument(
+        "-scale", help="pixels per world unit", type=float, default=2.0
+    )
+
+    parser.add_argument(
+        "-shape_type",
+        help="draw the complex (compound) or simple shapes",
+        type=str,
+        choices=["complex", "simple"],
+        default="complex",
+    )
+
+    parser.add_argument(
+        "-processes",
+        help="size of the worker pool, defaults to the number of cores",
+        type=int,
+        default=None,
+    )
+
+    args = parser.parse_args()
+
+    main(**vars(args))
@@ -0,0 +1,204 @@
+"""
+parameter sweep runner for the overlap agent
+
+Runs run_overlapagent.main over a grid or a list of parameter sets on a
+process pool and writes one consolidated results table. Every finished point
+is appended to the table straight away, so an interrupted sweep can be
+restarted with the same arguments and will skip the points already done.
+A point that raises is recorded with status failed and its error, and is
+run again on a restart.
+
+The shape data is loaded once per worker process and shared by every point
+that worker runs.
+
+Parameter sets:
+    -grid: json object mapping parameter names to lists of values, the sweep
+        runs every combination, e.g.
+        {"filename": ["a.csv", "b.csv"], "seed": [1, 2, 3],
+         "actions_per_zone": [100, 500], "num_loops": [50]}
+    -points: json list of parameter objects, run as given
+
+Example:
+    $ python run_sweep.py -grid sweep.json -results sweep_results.csv -processes 8
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+from multiprocessing import Pool
+from pathlib import Path
+
+from run_overlapagent import main as run_overlap_agent
+from src.grana_model.objectdata import load_type_dict
+
+DEFAULT_PARAMS = {
+    "filename": "082620_SEM_final_coordinates.csv",
+    "num_loops": 100,
+    "actions_per_zone": 500,
+    "seed": 0,
+    "object_data_exists": False,
+}
+
+METRIC_COLUMNS = [
+    "initial_overlap",
+    "final_overlap",
+    "best_overlap",
+    "overlap_reduction_pct",
+    "total_actions",
+    "actions_per_sec",
+    "wall_time",
+    "status",
+    "error",
+]
+
+# per worker process copy of the shape data, loaded once by _init_worker
+_TYPE_DICT = None
+
+
+def expand_grid(grid: dict) -> list:
+    """returns one parameter dict for every combination of the grid values"""
+    keys = list(grid.keys())
+    return [
+        dict(zip(keys, values))
+        for values in itertools.product(*(grid[key] for key in keys))
+    ]
+
+
+def get_point_id(params: dict) -> str:
+    """a stable id for a parameter set, used to skip points already done"""
+    key = json.dumps(params, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:12]
+
+
+def get_fieldnames(param_sets: list) -> list:
+    """the results columns: point_id, every parameter used by any of the
+    param_sets in first seen order, then the metrics"""
+    param_keys = {}
+    for params in param_sets:
+        param_keys.update(dict.fromkeys(params))
+    return ["point_id", *param_keys, *METRIC_COLUMNS]
+
+
+def read_completed(results_path: Path, fieldnames: list) -> set:
+    """the point_ids of the points already done. Raises ValueError if the
+    results file has different columns, as appending would misalign them"""
+    if not results_path.exists():
+        return set()
+
+    with open(results_path, newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames is not None and reader.fieldnames != fieldnames:
+            raise ValueError(
+                f"{results_path} has the columns {reader.fieldnames}, this "
+                f"sweep writes {fieldnames}, use another -results file"
+            )
+        return {row["point_id"] for row in reader if row["status"] == "done"}
+
+
+def _init_worker():
+    global _TYPE_DICT
+    _TYPE_DICT = load_type_dict()
+
+
+def _run_point(point: tuple) -> dict:
+    """runs one point, a point that raises is recorded as failed instead of
+    stopping the sweep"""
+    point_id, params = point
+    try:
+        summary = run_overlap_agent(
+            slurm_job_id=f"sweep_{point_id}",
+            type_dict=_TYPE_DICT,
+            export=False,
+            **params,
+        )
+    except Exception as e:
+        return {
+            "point_id": point_id,
+            **params,
+            "status": "failed",
+            "error": repr(e),
+        }
+    return {"point_id": point_id, **params, **summary, "status": "done"}
+
+
+def main(grid: str, points: str, results: str, processes: int):
+    if grid is not None:
+        with open(grid) as f:
+            param_sets = expand_grid(json.load(f))
+    else:
+        with open(points) as f:
+            param_sets = json.load(f)
+
+    param_sets = [{**DEFAULT_PARAMS, **params} for params in param_sets]
+    fieldnames = get_fieldnames(param_sets)
+    results_path = Path(results)
+    completed = read_completed(results_path, fieldnames)
+    todo = [
+        (get_point_id(params), params)
+        for params in param_sets
+        if get_point_id(params) not in completed
+    ]
+    print(
+        f"{len(param_sets)} points, {len(param_sets) - len(todo)} already done"
+    )
+
+    write_header = (
+        not results_path.exists() or results_path.stat().st_size == 0
+    )
+    with open(results_path, "a", newline="") as f, Pool(
+        processes=processes, initializer=_init_worker
+    ) as pool:
+        writer = csv.DictWriter(
+            f, fieldnames=fieldnames, extrasaction="ignore"
+        )
+        if write_header:
+            writer.writeheader()
+
+        for num_done, row in enumerate(
+            pool.imap_unordered(_run_point, todo), start=1
+        ):
+            writer.writerow(row)
+            f.flush()
+            if row["status"] == "failed":
+                print(
+                    f"[{num_done}/{len(todo)}] {row['point_id']}: "
+                    f"failed: {row['error']}"
+                )
+                continue
+            print(
+                f"[{num_done}/{len(todo)}] {row['point_id']}: "
+                f"overlap {row['initial_overlap']:.2f} -> {row['final_overlap']:.2f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="runs a parameter sweep of the overlap agent"
+    )
+
+    sets = parser.add_mutually_exclusive_group(required=True)
+    sets.add_argument(
+        "-grid", help="json file with a parameter grid", type=str
+    )
+    sets.add_argument(
+        "-points", help="json file with a list of parameter sets", type=str
+    )
+
+    parser.add_argument(
+        "-results",
+        help="consolidated results csv, appended to and used to resume",
+        type=str,
+        default="sweep_results.csv",
+    )
+
+    parser.add_argument(
+        "-processes",
+        help="size of the worker pool, defaults to the number of cores",
+        type=int,
+        default=None,
+    )
+
+    args = parser.parse_args()
+
+    main(**vars(args))
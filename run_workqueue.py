@@ -0,0 +1,170 @@
+"""
+shared filesystem work queue for overlap agent runs
+
+Replaces a fixed SLURM array split with work stealing: the queue holds one
+unit per coordinate file and seed, and every worker keeps taking units
+until none are left, so fast nodes do more of them. Workers are
+run_overlapagent.py started with -work_queue, a dead worker's unit is taken
+over once its lease expires, and merge writes every finished unit to one
+results table.
+
+Ops:
+    create: queues every filename x seed unit, units already queued or
+        finished are skipped, so it can be run again to extend a queue
+    status: prints the number of units in each state
+    merge: writes the results of every finished unit to -results
+    local: runs -workers worker processes on this machine, standing in for
+        nodes, then merges
+
+Example:
+    $ python run_workqueue.py create -queue /shared/q -filenames a.csv b.csv -seeds 1 2 3
+    $ srun python run_overlapagent.py -work_queue /shared/q -num_loops 100
+    $ python run_workqueue.py merge -queue /shared/q -results results.csv
+"""
+import argparse
+import csv
+import multiprocessing
+from pathlib import Path
+
+from run_overlapagent import work
+from src.grana_model.workqueue import WorkQueue
+
+RESULT_COLUMNS = [
+    "unit_id",
+    "filename",
+    "seed",
+    "worker_id",
+    "initial_overlap",
+    "final_overlap",
+    "best_overlap",
+    "overlap_reduction_pct",
+    "total_actions",
+    "actions_per_sec",
+    "wall_time",
+]
+
+
+def get_unit_id(filename: str, seed: int) -> str:
+    return f"{Path(filename).stem}_s{seed}"
+
+
+def create(queue: str, filenames: list, seeds: list):
+    work_queue = WorkQueue(queue)
+    num_added = work_queue.add(
+        {
+            get_unit_id(filename, seed): {"filename": filename, "seed": seed}
+            for filename in filenames
+            for seed in seeds
+        }
+    )
+    print(f"{num_added} units added, {work_queue.status()}")
+
+
+def merge(queue: str, results: str):
+    """writes the result of every finished unit to the results csv"""
+    records = WorkQueue(queue).results()
+    with open(results, "w", newline="") as f:
+        writer = csv.DictWriter(
+            f, fieldnames=RESULT_COLUMNS, extrasaction="ignore"
+        )
+        writer.writeheader()
+        for record in records:
+            writer.writerow(
+                {
+                    "unit_id": record["unit_id"],
+                    "worker_id": record["worker_id"],
+                    **record["params"],
+                    **record["result"],
+                }
+            )
+    print(f"{len(records)} results written to {results}")
+
+
+def local(
+    queue: str,
+    results: str,
+    workers: int,
+    lease_seconds: float,
+    num_loops: int,
+    actions_per_zone: int,
+):
+    """runs workers worker processes until the queue is empty, then merges"""
+    processes = [
+        multiprocessing.Process(
+            target=work,
+            args=(queue, f"local{worker_num}", lease_seconds),
+            kwargs={
+                "num_loops": num_loops,
+                "actions_per_zone": actions_per_zone,
+                "export": False,
+            },
+        )
+        for worker_num in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    print(WorkQueue(queue).status())
+    merge(queue, results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="shared filesystem work queue for overlap agent runs"
+    )
+    parser.add_argument("op", choices=["create", "status", "merge", "local"])
+    parser.add_argument(
+        "-queue", help="shared queue directory", type=str, default="queue/"
+    )
+    parser.add_argument(
+        "-filenames",
+        help="coordinate files in res/grana_coordinates/ to queue",
+        type=str,
+        nargs="+",
+        default=["082620_SEM_final_coordinates.csv"],
+    )
+    parser.add_argument(
+        "-seeds", help="seeds to queue for every file", type=int, nargs="+"
+    )
+    parser.add_argument(
+        "-results",
+        help="merged results csv",
+        type=str,
+        default="workqueue_results.csv",
+    )
+    parser.add_argument(
+        "-workers",
+        help="worker processes for the local op",
+        type=int,
+        default=max(1, multiprocessing.cpu_count() // 2),
+    )
+    parser.add_argument(
+        "-lease_seconds",
+        help="seconds without a heartbeat before a unit is taken over",
+        type=float,
+        default=300.0,
+    )
+    parser.add_argument("-num_loops", type=int, default=100)
+    parser.add_argument("-actions_per_zone", type=int, default=500)
+
+    args = parser.parse_args()
+
+    if args.op == "create":
+        if args.seeds is None:
+            parser.error("create needs -seeds")
+        create(args.queue, args.filenames, args.seeds)
+    elif args.op == "status":
+        print(WorkQueue(args.queue).status())
+    elif args.op == "merge":
+        merge(args.queue, args.results)
+    else:
+        local(
+            args.queue,
+            args.results,
+            args.workers,
+            args.lease_seconds,
+            args.num_loops,
+            args.actions_per_zone,
+        )
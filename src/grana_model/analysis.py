@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""packing metrics analysis
+
+This module computes packing metrics for exported coordinate files, in the
+`type,x,y,angle,area` format written by coordexport.write_coordinates.
+Frames are read one at a time and all pair searches go through a numpy cell
+list, so memory use is bounded by the size of a single frame no matter how
+many frames are analysed.
+
+Metrics per frame:
+    * nearest neighbour distance between object centres (mean, median, min)
+    * packing fraction, the summed object area over the disc area
+    * number density and area fraction in each Rings band
+
+Metrics accumulated over all frames:
+    * radial distribution function g(r), on fixed bins
+
+Example:
+    $ analysis = PackingAnalysis()
+    $ for frame in iter_frames(paths):
+    $     row = analysis.add_frame(frame)
+    $ r, g_r = analysis.radial_distribution()
+
+"""
+import csv
+from math import pi
+
+import numpy as np
+
+from .overlapagent import Rings
+
+
+class Frame:
+    """one exported step: object types, centres, angles and areas"""
+
+    def __init__(self, name, types, positions, angles, areas):
+        self.name = name
+        self.types = types
+        self.positions = positions
+        self.angles = angles
+        self.areas = areas
+
+    def __len__(self):
+        return len(self.types)
+
+
+def read_frame(path) -> Frame:
+    """reads an exported coordinate csv. Files without an area column, such as
+    input coordinate files, get an area of zero"""
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+
+    return Frame(
+        name=str(path),
+        types=np.array([row.get("type", "") for row in rows]),
+        positions=np.array(
+            [(float(row["x"]), float(row["y"])) for row in rows], dtype=float
+        ).reshape(-1, 2),
+        angles=np.array([float(row.get("angle", 0.0)) for row in rows]),
+        areas=np.array([float(row.get("area", 0.0)) for row in rows]),
+    )
+
+
+def iter_frames(paths):
+    """yields the frames in paths one at a time"""
+    for path in paths:
+        yield read_frame(path)
+
+
+def pairs_within(positions: np.ndarray, max_distance: float):
+    """returns (i, j, distance) arrays for every pair i < j whose centres are
+    closer than max_distance, found with a cell list of cell size
+    max_distance"""
+    n = len(positions)
+    if n < 2:
+        empty = np.empty(0, dtype=int)
+        return empty, empty, np.empty(0)
+
+    cells = np.floor(
+        (positions - positions.min(axis=0)) / max_distance
+    ).astype(np.int64)
+    num_cols = cells[:, 0].max() + 3
+    keys = (cells[:, 1] + 1) * num_cols + (cells[:, 0] + 1)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    pairs_i, pairs_j = [], []
+    # half stencil, so every pair of cells is searched once
+    for dx, dy in [(0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]:
+        neighbour_keys = sorted_keys + dy * num_cols + dx
+        start = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        stop = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+        counts = stop - start
+
+        a = np.repeat(np.arange(n), counts)
+        b = (
+            np.arange(counts.sum())
+            - np.repeat(np.cumsum(counts) - counts, counts)
+            + np.repeat(start, counts)
+        )
+        if dx == 0 and dy == 0:
+            keep = b > a
+            a, b = a[keep], b[keep]
+
+        pairs_i.append(order[a])
+        pairs_j.append(order[b])
+
+    i = np.concatenate(pairs_i)
+    j = np.concatenate(pairs_j)
+    distance = np.hypot(*(positions[i] - positions[j]).T)
+    close = distance < max_distance
+
+    return i[close], j[close], distance[close]
+
+
+def nearest_neighbour_distances(
+    positions: np.ndarray, max_distance: float
+) -> np.ndarray:
+    """distance from every centre to its nearest neighbour, nan where there
+    is no neighbour closer than max_distance"""
+    nearest = np.full(len(positions), np.inf)
+    i, j, distance = pairs_within(positions, max_distance)
+    np.minimum.at(nearest, i, distance)
+    np.minimum.at(nearest, j, distance)
+    nearest[np.isinf(nearest)] = np.nan
+    return nearest
+
+
+class PackingAnalysis:
+    """accumulates packing metrics over a stream of frames
+
+    Parameters:
+        origin_point: centre of the grana disc
+        disc_radius: radius used for the packing fraction
+        nn_max_distance: search radius for nearest neighbours
+        rdf_max_distance: largest r of the radial distribution function
+        rdf_bins: number of g(r) bins
+    """
+
+    def __init__(
+        self,
+        origin_point: tuple[float, float] = (200, 200),
+        disc_radius: float = 200.0,
+        nn_max_distance: float = 40.0,
+        rdf_max_distance: float = 100.0,
+        rdf_bins: int = 100,
+    ):
+        self.origin_point = np.asarray(origin_point, dtype=float)
+        self.disc_radius = disc_radius
+        self.nn_max_distance = nn_max_distance
+        self.bands = Rings.zone_distances[:-1]
+        self.band_areas = np.array(
+            [pi * (outer ** 2 - inner ** 2) for inner, outer in self.bands]
+        )
+        self.rdf_edges = np.linspace(0.0, rdf_max_distance, rdf_bins + 1)
+        self.rdf_counts = np.zeros(rdf_bins)
+        self.rdf_norm = np.zeros(rdf_bins)
+        self.num_frames = 0
+
+    @property
+    def columns(self) -> list:
+        band_names = [f"{inner:g}_{outer:g}" for inner, outer in self.bands]
+        return [
+            "frame",
+            "num_objects",
+            "nn_mean",
+            "nn_median",
+            "nn_min",
+            "packing_fraction",
+            *[f"density_{name}" for name in band_names],
+            *[f"area_fraction_{name}" for name in band_names],
+        ]
+
+    def add_frame(self, frame: Frame) -> dict:
+        """computes the per-frame metrics and adds the frame to g(r)"""
+        n = len(frame)
+        nearest = nearest_neighbour_distances(
+            frame.positions, self.nn_max_distance
+        )
+
+        radius = np.hypot(*(frame.positions - self.origin_point).T)
+        band_counts = np.empty(len(self.bands))
+        band_object_area = np.empty(len(self.bands))
+        for band_num, (inner, outer) in enumerate(self.bands):
+            in_band = (radius > inner) & (radius < outer)
+            band_counts[band_num] = in_band.sum()
+            band_object_area[band_num] = frame.areas[in_band].sum()
+
+        self._add_rdf(frame.positions)
+        self.num_frames += 1
+
+        row = {
+            "frame": frame.name,
+            "num_objects": n,
+            "nn_mean": np.nanmean(nearest) if n > 1 else np.nan,
+            "nn_median": np.nanmedian(nearest) if n > 1 else np.nan,
+            "nn_min": np.nanmin(nearest) if n > 1 else np.nan,
+            "packing_fraction": frame.areas.sum() / (pi * self.disc_radius ** 2),
+        }
+        num_bands = len(self.bands)
+        band_columns = self.columns[6:]
+        row.update(zip(band_columns[:num_bands], band_counts / self.band_areas))
+        row.update(
+            zip(band_columns[num_bands:], band_object_area / self.band_areas)
+        )
+        return row
+
+    def _add_rdf(self, positions: np.ndarray):
+        n = len(positions)
+        if n < 2:
+            return
+        _, _, distance = pairs_within(positions, self.rdf_edges[-1])
+        self.rdf_counts += np.histogram(distance, bins=self.rdf_edges)[0]
+
+        # expected pair counts per shell for an ideal gas at the same density
+        # in the disc, without edge correction
+        density = n / (pi * self.disc_radius ** 2)
+        shell_areas = pi * np.diff(self.rdf_edges ** 2)
+        self.rdf_norm += 0.5 * n * density * shell_areas
+
+    def radial_distribution(self) -> tuple[np.ndarray, np.ndarray]:
+        """returns the bin centres and g(r) over all frames added so far"""
+        centres = 0.5 * (self.rdf_edges[1:] + self.rdf_edges[:-1])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            g_r = self.rdf_counts / self.rdf_norm
+        return centres, g_r
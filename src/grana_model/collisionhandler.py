@@ -15,6 +15,12 @@ class CollisionHandler:
         self.total_collision_count = 0
         self.overlap_distance = 0.0
         self.space = space
+        # when set, pre_solve stores every contact in self.contacts and tells
+        # the solver to ignore the collision, so the step doesn't move bodies
+        self.record_contacts = False
+        self.contacts = []
+        # an OverlapMap that attributes every collision, or None
+        self.overlap_map = None
         self.collision_handler = self.space.add_collision_handler(1, 1)
         self.collision_handler.begin = self.__coll_begin
         self.collision_handler.pre_solve = self.__pre_solve
@@ -25,6 +31,16 @@ class CollisionHandler:
         set_ = arbiter.contact_point_set
         overlap_distance = set_.points[0].distance
         self.log_collision(overlap_distance)
+
+        if self.overlap_map is not None:
+            shape_a, shape_b = arbiter.shapes
+            self.overlap_map.record(shape_a.body, shape_b.body, set_)
+
+        if self.record_contacts:
+            shape_a, shape_b = arbiter.shapes
+            self.contacts.append((shape_a.body, shape_b.body, set_))
+            return False
+
         return True
 
     def __coll_begin(self, arbiter, space, data):
@@ -62,6 +78,9 @@ class CollisionHandler:
         self.total_collision_count += self.collision_count
         self.collision_count = 0
         self.overlap_distance = 0
+        self.contacts = []
+        if self.overlap_map is not None:
+            self.overlap_map.reset()
 
     def get_total_area(self):
         """gets a list of all shapes in space, and gets their area. adds it to
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""cached binary ingestion of coordinate files
+
+Parsing a coordinate csv with pandas on every start is slow when a sweep
+reuses the same files thousands of times. This module converts a coordinate
+csv once into .npy arrays in a cache directory, keyed by a hash of the file
+contents, so an edited file gets a new entry and a renamed or copied file
+reuses the old one. Later starts hash the file and load the arrays with a
+memory map instead of parsing it.
+
+Each cache entry is up to three files:
+    {digest}.xy.npy: float64 (n, 2) positions, always present
+    {digest}.type.npy: object type names, for files with a type column
+    {digest}.angle.npy: float64 angles, for files with an angle column
+
+Every array is written to a temporary file and renamed into place, and the
+xy array is written last, so parallel jobs never load a half-written entry.
+If the cache directory can't be written the csv is parsed as before.
+
+Example:
+    $ xy = load_positions("src/grana_model/res/grana_coordinates/file.csv")
+    $ ingest_directory("src/grana_model/res/grana_coordinates/", processes=8)
+
+"""
+import hashlib
+import os
+from multiprocessing import Pool
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = "src/grana_model/res/cache/"
+
+
+def file_digest(file_path) -> str:
+    """hex digest of the contents of file_path"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _entry_path(cache_dir, digest: str, name: str) -> Path:
+    return Path(cache_dir) / f"{digest}.{name}.npy"
+
+
+def _parse_csv(file_path) -> dict:
+    """reads the columns the ObjectData classes use from a coordinate csv"""
+    imported_csv = pd.read_csv(file_path)
+    arrays = {"xy": imported_csv[["x", "y"]].to_numpy(dtype=float)}
+    if "type" in imported_csv.columns:
+        arrays["type"] = imported_csv["type"].to_numpy(dtype=str)
+    if "angle" in imported_csv.columns:
+        arrays["angle"] = imported_csv["angle"].to_numpy(dtype=float)
+    return arrays
+
+
+def _save_atomic(path: Path, array: np.ndarray):
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def ingest(file_path, cache_dir=DEFAULT_CACHE_DIR, digest: str = None) -> str:
+    """converts file_path into a cache entry unless one exists already, and
+    returns its digest"""
+    if digest is None:
+        digest = file_digest(file_path)
+    if _entry_path(cache_dir, digest, "xy").exists():
+        return digest
+
+    arrays = _parse_csv(file_path)
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    for name in sorted(arrays, key=lambda name: name == "xy"):
+        _save_atomic(_entry_path(cache_dir, digest, name), arrays[name])
+    return digest
+
+
+def load_arrays(file_path, cache_dir=DEFAULT_CACHE_DIR) -> dict:
+    """returns the xy, and where present the type and angle, arrays of a
+    coordinate csv, memory mapped from the cache and ingesting it first if
+    needed"""
+    digest = file_digest(file_path)
+    try:
+        ingest(file_path, cache_dir=cache_dir, digest=digest)
+    except OSError:
+        # read-only or full cache directory
+        return _parse_csv(file_path)
+
+    arrays = {}
+    for name in ["xy", "type", "angle"]:
+        path = _entry_path(cache_dir, digest, name)
+        if path.exists():
+            arrays[name] = np.load(path, mmap_mode="r")
+    return arrays
+
+
+def load_positions(file_path, cache_dir=DEFAULT_CACHE_DIR) -> np.ndarray:
+    """returns the (n, 2) positions of a coordinate csv"""
+    return load_arrays(file_path, cache_dir)["xy"]
+
+
+def _ingest_one(job: tuple) -> tuple:
+    file_path, cache_dir = job
+    return str(file_path), ingest(file_path, cache_dir=cache_dir)
+
+
+def ingest_directory(
+    directory,
+    cache_dir=DEFAULT_CACHE_DIR,
+    pattern: str = "*.csv",
+    processes: int = None,
+) -> dict:
+    """ingests every file in directory matching pattern on a process pool and
+    returns a dict of file path to digest"""
+    jobs = [(path, cache_dir) for path in sorted(Path(directory).glob(pattern))]
+    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+    with Pool(processes=processes) as pool:
+        return dict(pool.imap_unordered(_ingest_one, jobs))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""asynchronous, decimated coordinate export
+
+Writing a step's coordinates means formatting every object into a csv row,
+which used to happen on the optimisation thread after every step. An
+AsyncCoordinateExporter instead copies the positions and angles into numpy
+arrays, which is O(n) and cheap, and hands them through a bounded queue to a
+writer thread that formats and writes the file. When the writer falls
+behind the queue fills up and submit() blocks until there is room, so a slow
+filesystem slows the job down instead of using up memory.
+
+An ExportPolicy decides which steps are exported at all:
+    every: only every Nth step
+    on_best: only steps whose overlap is the lowest exported so far
+    min_interval: at most one export per min_interval seconds
+A step is exported when it passes all three.
+
+Example:
+    $ exporter = AsyncCoordinateExporter(object_list, ExportPolicy(every=10))
+    $ if exporter.policy.should_export(step_num, overlap):
+    $     exporter.submit(path, zone_list)
+    $ exporter.close()
+
+"""
+import csv
+import queue
+import threading
+from pathlib import Path
+from time import monotonic
+
+import numpy as np
+
+from .overlapmap import write_maps
+from .snapshot import StateSnapshot
+
+
+def write_coordinates(
+    path,
+    types: list,
+    positions: np.ndarray,
+    angles: np.ndarray,
+    areas: np.ndarray,
+    overlap_area: np.ndarray = None,
+    object_overlap: np.ndarray = None,
+):
+    """writes one exported step in the type,x,y,angle,area format, with
+    overlap_area and overlap columns if they are given"""
+    header = ["type", "x", "y", "angle", "area"]
+    columns = [
+        types,
+        np.round(positions[:, 0], 2).tolist(),
+        np.round(positions[:, 1], 2).tolist(),
+        np.round(angles, 2).tolist(),
+        np.round(areas, 2).tolist(),
+    ]
+    if overlap_area is not None:
+        header.append("overlap_area")
+        columns.append(np.round(overlap_area, 2).tolist())
+    if object_overlap is not None:
+        header.append("overlap")
+        columns.append(np.round(object_overlap, 3).tolist())
+
+    with open(path, "w", newline="") as f:
+        write = csv.writer(f)
+        write.writerow(header)
+        write.writerows(zip(*columns))
+
+
+class ExportPolicy:
+    """Parameters:
+        every (int): export every Nth step. Default=1
+        on_best (bool): only export steps that improve on the lowest
+        overlap exported so far. Default=False
+        min_interval (float): minimum seconds between exports. Default=0
+    """
+
+    def __init__(
+        self, every: int = 1, on_best: bool = False, min_interval: float = 0.0
+    ):
+        if every < 1:
+            raise ValueError(f"every must be at least 1, got {every}")
+        self.every = every
+        self.on_best = on_best
+        self.min_interval = min_interval
+        self.best_overlap = None
+        self._last_export = None
+
+    def should_export(self, step_num: int, overlap: float) -> bool:
+        """decides whether step_num is exported, and records it if it is"""
+        if step_num % self.every != 0:
+            return False
+        if (
+            self.on_best
+            and self.best_overlap is not None
+            and overlap >= self.best_overlap
+        ):
+            return False
+        now = monotonic()
+        if (
+            self._last_export is not None
+            and now - self._last_export < self.min_interval
+        ):
+            return False
+
+        self._last_export = now
+        if self.best_overlap is None or overlap < self.best_overlap:
+            self.best_overlap = overlap
+        return True
+
+
+class AsyncCoordinateExporter:
+    """Parameters:
+        object_list (list of PSIIStructure): every object that may be
+        exported, in the order of their index attribute
+        policy (ExportPolicy): defaults to exporting every step
+        queue_size (int): snapshots waiting to be written before submit
+        blocks
+    """
+
+    def __init__(
+        self,
+        object_list: list,
+        policy: ExportPolicy = None,
+        queue_size: int = 4,
+    ):
+        self.policy = policy if policy is not None else ExportPolicy()
+        self.types = [obj.type for obj in object_list]
+        # shape areas never change, so they are summed once
+        self.areas = np.array([obj.area for obj in object_list])
+        self.num_written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(
+        self,
+        path,
+        zone_list: list,
+        overlap_area: np.ndarray = None,
+        overlap_map=None,
+    ):
+        """snapshots the objects in zone_list and queues them to be written
+        to path, blocking while the queue is full. With an OverlapMap the
+        per-object overlap is added as a column and the heatmap and type pair
+        matrix are written next to path"""
+        if self._error is not None:
+            raise self._error
+
+        snapshot = StateSnapshot.capture(zone_list)
+        index = np.array([obj.index for obj in zone_list], dtype=int)
+        if overlap_area is not None:
+            overlap_area = np.asarray(overlap_area)[index]
+        maps = None if overlap_map is None else overlap_map.copy_maps()
+        self._queue.put((path, index, snapshot, overlap_area, maps))
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            path, index, snapshot, overlap_area, maps = job
+            try:
+                write_coordinates(
+                    path,
+                    [self.types[i] for i in index.tolist()],
+                    snapshot.positions,
+                    snapshot.angles,
+                    self.areas[index],
+                    overlap_area,
+                    None if maps is None else maps[0][index],
+                )
+                if maps is not None:
+                    write_maps(Path(path).with_suffix(""), maps[1], maps[2])
+                self.num_written += 1
+            except Exception as e:
+                # raised on the optimisation thread by the next submit/close
+                self._error = e
+
+    def close(self):
+        """waits for every queued snapshot to be written"""
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
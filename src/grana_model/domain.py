@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""spatial domain decomposition
+
+This module splits a coordinate set into a grid of spatial tiles and optimises
+each tile with its own OverlapAgent in a separate worker process, so grana
+discs far larger than the 211 PSII default can use every core of a node.
+
+Each sync point works like this:
+    1. every object is assigned to the tile that contains its current
+       position, which is how objects migrate between tiles
+    2. each tile gets its owned objects plus the "halo": objects owned by
+       neighbouring tiles that lie within halo_width of the tile edge. Halo
+       objects take part in collisions but are never acted on.
+    3. the workers run actions_per_sync actions on their owned objects and
+       send back the new positions and angles, which are merged
+
+The grid is shifted by half a tile on every other sync, so objects that sat on
+a tile boundary in one sync are in a tile interior in the next.
+
+With proposal_stream set, every tile of every sync draws its actions from its
+own ProposalStream, spawned from the sync's seed with replica_streams.
+
+Example:
+    $ positions, angles, history = run_decomposed(
+        obj_types, positions, angles, tiles=(4, 4), num_syncs=20)
+
+.. _Google Python Style Guide:
+   http://google.github.io/styleguide/pyguide.html
+
+"""
+import random
+from multiprocessing import Pool
+
+import numpy as np
+import pymunk
+
+from .collisionhandler import CollisionHandler
+from .objectdata import ObjectData, load_type_dict
+from .overlapagent import OverlapAgent, SingleZone
+from .proposals import replica_streams
+from .spawner import Spawner
+
+# per worker process copy of the shape data, loaded once by _init_worker
+_TYPE_DICT = None
+
+
+def max_object_radius(type_dict: dict, shape_type: str = "complex") -> float:
+    """returns the largest distance from a body origin to any shape vertex,
+    over all object types"""
+    key = "shapes_simple" if shape_type == "simple" else "shapes_compound"
+    return max(
+        float(np.max(np.hypot(*np.asarray(coords, dtype=float).T)))
+        for obj_dict in type_dict.values()
+        for coords in obj_dict[key]
+    )
+
+
+class TileGrid:
+    """a regular nx by ny grid of tiles covering bounds, with an optional
+    offset used to stagger the grid between syncs"""
+
+    def __init__(
+        self,
+        bounds: tuple[float, float, float, float],
+        tiles: tuple[int, int],
+        halo_width: float,
+        offset: tuple[float, float] = (0.0, 0.0),
+    ):
+        self.x_min, self.y_min, self.x_max, self.y_max = bounds
+        self.nx, self.ny = tiles
+        self.halo_width = halo_width
+        self.offset = offset
+        self.tile_w = (self.x_max - self.x_min) / self.nx
+        self.tile_h = (self.y_max - self.y_min) / self.ny
+
+    @property
+    def num_tiles(self):
+        return self.nx * self.ny
+
+    def _cell(self, positions: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        ix = np.floor(
+            (positions[:, 0] - self.x_min - self.offset[0]) / self.tile_w
+        ).astype(int)
+        iy = np.floor(
+            (positions[:, 1] - self.y_min - self.offset[1]) / self.tile_h
+        ).astype(int)
+        # objects that have left the bounds stay with the edge tiles
+        return np.clip(ix, 0, self.nx - 1), np.clip(iy, 0, self.ny - 1)
+
+    def tile_of(self, positions: np.ndarray) -> np.ndarray:
+        """returns the owning tile index of every position"""
+        ix, iy = self._cell(positions)
+        return iy * self.nx + ix
+
+    def tile_rect(self, tile: int) -> tuple[float, float, float, float]:
+        """returns (x0, y0, x1, y1) of the tile. Edge tiles extend to
+        infinity, matching the clipping in tile_of"""
+        ix, iy = tile % self.nx, tile // self.nx
+        x0 = self.x_min + self.offset[0] + ix * self.tile_w
+        y0 = self.y_min + self.offset[1] + iy * self.tile_h
+        return (
+            -np.inf if ix == 0 else x0,
+            -np.inf if iy == 0 else y0,
+            np.inf if ix == self.nx - 1 else x0 + self.tile_w,
+            np.inf if iy == self.ny - 1 else y0 + self.tile_h,
+        )
+
+    def halo_mask(self, positions: np.ndarray, owner: np.ndarray, tile: int):
+        """returns a mask of the objects not owned by tile that lie within
+        halo_width of it"""
+        x0, y0, x1, y1 = self.tile_rect(tile)
+        h = self.halo_width
+        near = (
+            (positions[:, 0] > x0 - h)
+            & (positions[:, 0] < x1 + h)
+            & (positions[:, 1] > y0 - h)
+            & (positions[:, 1] < y1 + h)
+        )
+        return near & (owner != tile)
+
+
+def _init_worker(res_path: str):
+    global _TYPE_DICT
+    _TYPE_DICT = load_type_dict(res_path)
+
+
+def _optimise_tile(payload: dict) -> dict:
+    """worker entry point: builds a space holding the tile's owned and halo
+    objects, runs an OverlapAgent on the owned objects and returns their new
+    positions and angles"""
+    random.seed(payload["seed"])
+    space = pymunk.Space()
+    collision_handler = CollisionHandler(space)
+    spawner = Spawner(
+        object_data=ObjectData(None, type_dict=_TYPE_DICT),
+        shape_type=payload["shape_type"],
+        space=space,
+        batch=None,
+        spawn_type="psii_only",
+        num_psii=0,
+        spawn_seed=payload["seed"],
+    )
+
+    object_list = spawner.spawn_bulk(
+        payload["obj_types"], payload["positions"], payload["angles"]
+    )
+    num_owned = payload["num_owned"]
+    owned_list = object_list[:num_owned]
+
+    overlap_agent = OverlapAgent(
+        object_list=owned_list,
+        area_strategy=SingleZone(owned_list),
+        collision_handler=collision_handler,
+        space=space,
+        num_actions=payload["num_actions"],
+        proposals=payload["proposals"],
+    )
+    overlap_begin = overlap_agent._update_space()
+    overlap_agent.overlap_distance = overlap_begin
+
+    if num_owned > 0:
+        overlap_agent.run(num_actions=payload["num_actions"])
+
+    return {
+        "index": payload["index"],
+        "positions": np.array(
+            [tuple(obj.body.position) for obj in owned_list], dtype=float
+        ).reshape(-1, 2),
+        "angles": np.array([obj.body.angle for obj in owned_list], dtype=float),
+        "overlap_begin": overlap_begin,
+        "overlap_end": overlap_agent.overlap_distance,
+    }
+
+
+def run_decomposed(
+    obj_types: list,
+    positions: np.ndarray,
+    angles: np.ndarray,
+    tiles: tuple[int, int] = (2, 2),
+    num_syncs: int = 10,
+    actions_per_sync: int = 500,
+    processes: int = None,
+    halo_width: float = None,
+    shape_type: str = "complex",
+    seed: int = 0,
+    res_path: str = "src/grana_model/res/",
+    proposal_stream: bool = False,
+):
+    """optimises the objects with one worker per tile, returns the final
+    positions and angles, and a list with the summed tile overlap before and
+    after every sync"""
+    obj_types = np.asarray(obj_types)
+    positions = np.array(positions, dtype=float)
+    angles = np.array(angles, dtype=float)
+
+    if halo_width is None:
+        halo_width = 2 * max_object_radius(load_type_dict(res_path), shape_type)
+
+    bounds = (
+        positions[:, 0].min(),
+        positions[:, 1].min(),
+        positions[:, 0].max(),
+        positions[:, 1].max(),
+    )
+    num_tiles = tiles[0] * tiles[1]
+    seed_seq = np.random.SeedSequence(seed if seed != 0 else None)
+    history = []
+
+    with Pool(
+        processes=processes or num_tiles,
+        initializer=_init_worker,
+        initargs=(res_path,),
+    ) as pool:
+        for sync_num, sync_seeds in enumerate(
+            seed_seq.spawn(num_syncs)
+        ):
+            grid = TileGrid(bounds, tiles, halo_width)
+            if sync_num % 2 == 1:
+                grid.offset = (grid.tile_w / 2, grid.tile_h / 2)
+
+            owner = grid.tile_of(positions)
+            tile_seeds = sync_seeds.generate_state(num_tiles)
+            tile_streams = (
+                replica_streams(sync_seeds, num_tiles)
+                if proposal_stream
+                else [None] * num_tiles
+            )
+            payloads = []
+            for tile in range(num_tiles):
+                owned = np.flatnonzero(owner == tile)
+                halo = np.flatnonzero(grid.halo_mask(positions, owner, tile))
+                index = np.concatenate((owned, halo))
+                payloads.append(
+                    {
+                        "index": owned,
+                        "num_owned": len(owned),
+                        "obj_types": obj_types[index].tolist(),
+                        "positions": positions[index],
+                        "angles": angles[index],
+                        "num_actions": actions_per_sync,
+                        "shape_type": shape_type,
+                        "seed": int(tile_seeds[tile]),
+                        "proposals": tile_streams[tile],
+                    }
+                )
+
+            overlap_begin = overlap_end = 0.0
+            for result in pool.imap_unordered(_optimise_tile, payloads):
+                positions[result["index"]] = result["positions"]
+                angles[result["index"]] = result["angles"]
+                overlap_begin += result["overlap_begin"]
+                overlap_end += result["overlap_end"]
+
+            history.append((sync_num, overlap_begin, overlap_end))
+
+    return positions, angles, history
@@ -0,0 +1,61 @@
+from pymunk import Space
+
+# notes:
+# space.shape_query() updates the bounding box of the query shape from its
+# body's current transform, but the other shapes are found through the spatial
+# index, so a body has to be reindexed after it moves and before it is scored.
+
+
+def pair_overlap(contact_set, reverse_contact_set) -> float:
+    """penetration depth of a pair of shapes from the contact sets of both
+    directions, 0 if either finds no penetration"""
+    depths = []
+    for points in [contact_set.points, reverse_contact_set.points]:
+        if not points or points[0].distance >= 0:
+            return 0.0
+        depths.append(-1 * points[0].distance)
+    return min(depths)
+
+
+class GeometryScorer:
+    """scores overlap straight from the current shape geometry, without
+    calling space.step(). Nothing is integrated and no velocity callbacks run,
+    so an undo puts the space back exactly as it was.
+
+    The overlap of a pair of shapes is the penetration depth of the first
+    contact point, the measure CollisionHandler.log_collision uses. That depth
+    depends on which shape of the pair is queried, so each pair is scored as
+    the smaller depth over both directions. A pair then scores the same from
+    either object, and update() followed by object_overlap() agrees with
+    total_overlap()."""
+
+    def __init__(self, space: Space, collision_type: int = 1):
+        self.space = space
+        self.collision_type = collision_type
+
+    def object_overlap(self, obj) -> float:
+        """sums the overlap between the shapes of obj and the shapes of every
+        other body"""
+        overlap_distance = 0.0
+
+        for shape in obj.shapes:
+            for info in self.space.shape_query(shape):
+                if (
+                    info.shape.body is obj.body
+                    or info.shape.collision_type != self.collision_type
+                ):
+                    continue
+                overlap_distance += pair_overlap(
+                    info.contact_point_set, info.shape.shapes_collide(shape)
+                )
+
+        return overlap_distance
+
+    def total_overlap(self, object_list: list) -> float:
+        """overlap over every pair of objects in object_list, each pair
+        counted once"""
+        return sum(self.object_overlap(obj) for obj in object_list) / 2
+
+    def update(self, obj):
+        """updates the collision data of obj after it has moved"""
+        self.space.reindex_shapes_for_body(obj.body)
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""live metrics for long-running overlap agent jobs
+
+A MetricsExporter samples an OverlapAgent from a background thread every
+interval seconds and publishes the sample in the Prometheus text format,
+either written atomically to a textfile collector file, served over HTTP on
+a local port, or both. The agent only keeps plain integer counters, so
+sampling costs the optimisation loop nothing beyond the GIL switches of the
+sampling thread.
+
+Metrics, all labelled with the job_id:
+    grana_overlap: current overlap
+    grana_best_overlap: lowest overlap captured so far
+    grana_actions_total: actions taken
+    grana_actions_per_second: action rate over the last interval
+    grana_acceptance_ratio: fraction of moves and rotations kept, over the
+        last interval
+    grana_zone, grana_zones_total: zone being worked on, and zones per step
+    grana_step, grana_steps_total: last finished step, and steps in the job
+    grana_step_seconds: process time of the last finished step
+    grana_rss_bytes: resident set size of the process
+
+Example:
+    $ exporter = MetricsExporter(overlap_agent, job_id, textfile="job.prom")
+    $ exporter.start()
+    $ ...
+    $ exporter.record_step(step_num, step_time)
+    $ ...
+    $ exporter.stop()
+
+"""
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+
+METRICS = [
+    ("grana_overlap", "gauge", "current overlap"),
+    ("grana_best_overlap", "gauge", "lowest overlap captured so far"),
+    ("grana_actions_total", "counter", "actions taken"),
+    ("grana_actions_per_second", "gauge", "action rate over the last interval"),
+    (
+        "grana_acceptance_ratio",
+        "gauge",
+        "fraction of moves and rotations kept",
+    ),
+    ("grana_zone", "gauge", "zone being worked on"),
+    ("grana_zones_total", "gauge", "zones per step"),
+    ("grana_step", "gauge", "last finished step"),
+    ("grana_steps_total", "gauge", "steps in the job"),
+    ("grana_step_seconds", "gauge", "process time of the last finished step"),
+    ("grana_rss_bytes", "gauge", "resident set size of the process"),
+]
+
+
+def get_rss_bytes() -> int:
+    """current resident set size, or the peak where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MetricsExporter:
+    """Parameters:
+        textfile (str): path of the Prometheus textfile to write, or None
+        port (int): local port to serve the metrics on, or None
+        interval (float): seconds between samples
+        num_steps (int): steps in the job, for grana_steps_total
+    """
+
+    def __init__(
+        self,
+        overlap_agent,
+        job_id: str,
+        textfile: str = None,
+        port: int = None,
+        interval: float = 10.0,
+        num_steps: int = 0,
+    ):
+        self.overlap_agent = overlap_agent
+        self.job_id = job_id
+        self.textfile = textfile
+        self.port = port
+        self.interval = interval
+        self.num_steps = num_steps
+        self.step_num = -1
+        self.step_time = 0.0
+        self.text = ""
+
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+        self._last_time = monotonic()
+        self._last_taken = overlap_agent.actions_taken
+        self._last_proposed = overlap_agent.actions_proposed
+        self._last_rejected = overlap_agent.actions_rejected
+
+    def record_step(self, step_num: int, step_time: float):
+        """called by the main loop after every step"""
+        self.step_num = step_num
+        self.step_time = step_time
+
+    def sample(self) -> dict:
+        """reads the agent counters and returns the current metric values"""
+        agent = self.overlap_agent
+        now = monotonic()
+        taken = agent.actions_taken
+        proposed = agent.actions_proposed
+        rejected = agent.actions_rejected
+        new_taken = taken - self._last_taken
+        new_proposed = proposed - self._last_proposed
+        new_rejected = rejected - self._last_rejected
+        elapsed = now - self._last_time
+        (
+            self._last_time,
+            self._last_taken,
+            self._last_proposed,
+            self._last_rejected,
+        ) = (now, taken, proposed, rejected)
+
+        best = agent.best_snapshot
+        return {
+            "grana_overlap": agent.overlap_distance,
+            "grana_best_overlap": (
+                best.overlap if best is not None else agent.overlap_distance
+            ),
+            "grana_actions_total": taken,
+            "grana_actions_per_second": (
+                new_taken / elapsed if elapsed > 0 else 0.0
+            ),
+            "grana_acceptance_ratio": (
+                1 - new_rejected / new_proposed if new_proposed > 0 else 0.0
+            ),
+            "grana_zone": agent.zone_num,
+            "grana_zones_total": agent.area_strategy.total_zones,
+            "grana_step": self.step_num,
+            "grana_steps_total": self.num_steps,
+            "grana_step_seconds": self.step_time,
+            "grana_rss_bytes": get_rss_bytes(),
+        }
+
+    def format(self, values: dict) -> str:
+        """renders values in the Prometheus text exposition format"""
+        lines = []
+        for name, metric_type, help_text in METRICS:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            lines.append(f'{name}{{job_id="{self.job_id}"}} {values[name]}')
+        return "\n".join(lines) + "\n"
+
+    def publish(self):
+        """takes a sample and writes it to the textfile and the http endpoint"""
+        self.text = self.format(self.sample())
+        if self.textfile is not None:
+            # the collector must never read a half-written file
+            tmp_path = f"{self.textfile}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(self.text)
+            os.replace(tmp_path, self.textfile)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.publish()
+
+    def _serve(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = exporter.text.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def start(self):
+        """publishes a first sample and starts the sampling thread, and the
+        http server if a port was given"""
+        self.publish()
+        if self.port is not None:
+            self._serve()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """stops the threads and publishes a final sample"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.publish()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
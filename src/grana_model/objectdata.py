@@ -1,11 +1,46 @@
 from typing import Any, Iterator
-import pandas as pd
-import random
 from math import pi
 import numpy as np
 import pickle
 import os
 
+from .coordcache import load_arrays
+
+OBJECT_COLORS = {
+    "LHCII": (0, 51, 0, 255),  # darkest green
+    "LHCII_monomer": (0, 75, 0, 255),  # darkest green
+    "C2S2M2": (0, 102, 0, 255),
+    "C2S2M": (0, 153, 0, 255),
+    "C2S2": (102, 204, 0, 255),
+    "C2": (128, 255, 0, 255),
+    "C1": (178, 255, 102, 255),  # lightest green
+    "CP43": (178, 255, 103, 255),  # same coordinates as C1, same color
+    "cytb6f": (51, 153, 255, 255),  # light blue
+}
+
+# the index of a type in OBJECT_TYPES is its compact type code
+OBJECT_TYPES = tuple(OBJECT_COLORS.keys())
+
+
+def load_type_dict(res_path: str = "src/grana_model/res/") -> dict:
+    """loads the shape data for every object type in OBJECT_COLORS, so it can
+    be loaded once and shared between many ObjectData instances"""
+    type_dict = {}
+    for obj_type, color in OBJECT_COLORS.items():
+        with open(f"{res_path}shapes/{obj_type}.pickle", "rb") as f:
+            shapes_compound = pickle.load(f)
+        with open(f"{res_path}shapes/{obj_type}_simple.pickle", "rb") as f:
+            shapes_simple = pickle.load(f)
+
+        type_dict[obj_type] = {
+            "obj_type": obj_type,
+            "shapes_compound": shapes_compound,
+            "shapes_simple": shapes_simple,
+            "sprite": f"{obj_type.lower()}.png",
+            "color": color,
+        }
+    return type_dict
+
 
 class ObjectData:
     """This data structure"""
@@ -15,27 +50,26 @@ class ObjectData:
         pos_csv_filename: str,
         spawn_seed=0,
         res_path: str = "src/grana_model/res/",
+        type_dict: dict = None,
     ):
-        self.__object_colors_dict = {
-            "LHCII": (0, 51, 0, 255),  # darkest green
-            "LHCII_monomer": (0, 75, 0, 255),  # darkest green
-            "C2S2M2": (0, 102, 0, 255),
-            "C2S2M": (0, 153, 0, 255),
-            "C2S2": (102, 204, 0, 255),
-            "C2": (128, 255, 0, 255),
-            "C1": (178, 255, 102, 255),  # lightest green
-            "CP43": (178, 255, 103, 255),  # same coordinates as C1, same color
-            "cytb6f": (51, 153, 255, 255),  # light blue
-        }
+        self.__object_colors_dict = OBJECT_COLORS
         self.res_path = res_path
-        self.type_dict = {
-            obj_type: self.__generate_object_dict(obj_type)
-            for obj_type in self.__object_colors_dict.keys()
-        }
+        if type_dict is not None:
+            self.type_dict = type_dict
+        else:
+            self.type_dict = {
+                obj_type: self.__generate_object_dict(obj_type)
+                for obj_type in self.__object_colors_dict.keys()
+            }
 
-        self.pos_list = self.__import_pos_data(
-            f"{self.res_path}/grana_coordinates/{pos_csv_filename}"
-        )
+        # without a coordinate file only the type data is loaded, for callers
+        # that spawn objects from their own position arrays
+        if pos_csv_filename is None:
+            self.pos_list = []
+        else:
+            self.pos_list = self.__import_pos_data(
+                f"{self.res_path}/grana_coordinates/{pos_csv_filename}"
+            )
 
         self.object_list = self.__generate_object_list(spawn_seed=spawn_seed,)
 
@@ -51,9 +85,9 @@ class ObjectData:
         return obj_dict
 
     def __import_pos_data(self, file_path):
-        """Imports the (x, y) positions from the csv data file provided in filename"""
-        imported_csv = pd.read_csv(file_path)
-        return pd.DataFrame(imported_csv, columns=["x", "y"]).values.tolist()
+        """Imports the (x, y) positions from the csv data file provided in
+        filename, through the binary cache in res/cache/"""
+        return load_arrays(file_path, f"{self.res_path}cache/")["xy"].tolist()
 
     def __load_simple_shapes(self, obj_type):
         with open(f"{self.res_path}shapes/{obj_type}_simple.pickle", "rb") as f:
@@ -137,14 +171,19 @@ class ObjectData:
         obj_types = rng.choice(
             structure_types, len(self.pos_list), replace=True, p=structure_p
         )
-        random_pos_list = random.sample(self.pos_list, len(self.pos_list))
+        # positions and angles come from the same seeded rng as the types,
+        # so a spawn is reproducible from spawn_seed alone
+        random_pos_list = [
+            self.pos_list[i] for i in rng.permutation(len(self.pos_list))
+        ]
+        angles = (2 * pi * rng.random(len(self.pos_list))).tolist()
         # print(len(random_pos_list))
 
-        for pos, obj_type in zip(random_pos_list, obj_types):
+        for pos, obj_type, angle in zip(random_pos_list, obj_types, angles):
             obj_entry = {
                 "obj_type": obj_type,
                 "pos": pos,
-                "angle": (2 * pi * random.random()),
+                "angle": angle,
                 "sprite": self.type_dict[obj_type]["sprite"],
                 "color": self.type_dict[obj_type]["color"],
                 "shapes_simple": self.type_dict[obj_type]["shapes_simple"],
@@ -166,23 +205,18 @@ class ObjectData:
 class ObjectDataExistingData(ObjectData):
     """This data structure"""
 
-    def __init__(self, pos_csv_filename: str, spawn_seed=0):
-        self.__object_colors_dict = {
-            "LHCII": (0, 51, 0, 255),  # darkest green
-            "LHCII_monomer": (0, 75, 0, 255),  # darkest green
-            "C2S2M2": (0, 102, 0, 255),
-            "C2S2M": (0, 153, 0, 255),
-            "C2S2": (102, 204, 0, 255),
-            "C2": (128, 255, 0, 255),
-            "C1": (178, 255, 102, 255),  # lightest green
-            "CP43": (178, 255, 103, 255),  # same coordinates as C1, same color
-            "cytb6f": (51, 153, 255, 255),  # light blue
-        }
+    def __init__(
+        self, pos_csv_filename: str, spawn_seed=0, type_dict: dict = None
+    ):
+        self.__object_colors_dict = OBJECT_COLORS
         self.res_path = "src/grana_model/res/"
-        self.type_dict = {
-            obj_type: self.__generate_object_dict(obj_type)
-            for obj_type in self.__object_colors_dict.keys()
-        }
+        if type_dict is not None:
+            self.type_dict = type_dict
+        else:
+            self.type_dict = {
+                obj_type: self.__generate_object_dict(obj_type)
+                for obj_type in self.__object_colors_dict.keys()
+            }
 
         self.pos_list = self.__import_pos_data(
             f"{self.res_path}/grana_coordinates/{pos_csv_filename}"
@@ -202,11 +236,17 @@ class ObjectDataExistingData(ObjectData):
         return obj_dict
 
     def __import_pos_data(self, file_path):
-        """Imports the (x, y) positions from the csv data file provided in filename"""
-        imported_csv = pd.read_csv(file_path)
-        return pd.DataFrame(
-            imported_csv, columns=["type", "x", "y", "angle"]
-        ).values.tolist()
+        """Imports the type, x, y and angle of each object from the csv data
+        file provided in filename, through the binary cache in res/cache/"""
+        arrays = load_arrays(file_path, f"{self.res_path}cache/")
+        return [
+            [obj_type, x, y, angle]
+            for obj_type, (x, y), angle in zip(
+                arrays["type"].tolist(),
+                arrays["xy"].tolist(),
+                arrays["angle"].tolist(),
+            )
+        ]
 
     def __load_simple_shapes(self, obj_type):
         with open(f"{self.res_path}shapes/{obj_type}_simple.pickle", "rb") as f:
@@ -32,10 +32,14 @@ from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
 
+import numpy as np
 import pymunk
 
 from .collisionhandler import CollisionHandler
+from .geometryscorer import GeometryScorer
+from .proposals import ProposalStream
 from .psiistructure import PSIIStructure
+from .snapshot import StateSnapshot
 from .simulationenv import SimulationEnvironment
 
 # from time import process_time, strftime
@@ -56,24 +60,30 @@ class AreaStrategy(ABC):
     def total_zones(self):
         pass
 
+    def active_objects(self, margin: float) -> list:
+        """returns the objects in the current zone or within margin of it.
+        Strategies that can't tell return every object"""
+        return self.object_list
+
 
 class Rings(AreaStrategy):
     """divides all the objects into fives bands and will return band lists as requested"""
 
+    zone_distances = [
+        (0.0, 89.0),
+        (89.0, 127.0),
+        (127.0, 155.0),
+        (155.0, 178.0),
+        (178.0, 200.0),
+        (0.0, 200.0),
+    ]
+
     def __init__(
         self, object_list: list, origin_point: tuple[float, float] = (200, 200)
     ):
         self.object_list = object_list
         self.origin_point = origin_point
         self.index = -1
-        self.zone_distances = [
-            (0.0, 89.0),
-            (89.0, 127.0),
-            (127.0, 155.0),
-            (155.0, 178.0),
-            (178.0, 200.0),
-            (0.0, 200.0),
-        ]
         self.zone_list = self.create_zones(self.object_list)
 
     def reset(self):
@@ -112,6 +122,17 @@ class Rings(AreaStrategy):
             raise StopIteration
         return self.zone_list[self.index]
 
+    def active_objects(self, margin: float) -> list:
+        """returns the objects in the current band widened by margin"""
+        inner, outer = self.zone_distances[self.index]
+        return [
+            object
+            for object in self.object_list
+            if self._object_in_ring(
+                object=object, band=(inner - margin, outer + margin)
+            )
+        ]
+
     def _object_in_ring(self, object, band: tuple[float, float]):
         """Check if the object is within the given range band"""
 
@@ -174,6 +195,15 @@ class ExpandingCircle(AreaStrategy):
             raise StopIteration
         return self.zone_list[self.index]
 
+    def active_objects(self, margin: float) -> list:
+        """returns the objects in the current circle widened by margin"""
+        distance = self.zone_distances[self.index] + margin
+        return [
+            object
+            for object in self.object_list
+            if self._object_in_zone(object=object, distance=distance)
+        ]
+
     def _object_in_zone(self, object, distance: float):
         """Check if the object is within the given distance from origin_point, returns"""
         x0, y0 = self.origin_point
@@ -186,6 +216,34 @@ class ExpandingCircle(AreaStrategy):
             return False
 
 
+class SingleZone(AreaStrategy):
+    """treats the whole object_list as one zone, for callers that have already
+    chosen which objects the agent may act on"""
+
+    def __init__(self, object_list: list, origin_point=None):
+        self.object_list = object_list
+        self.index = -1
+
+    @property
+    def total_zones(self):
+        return 1
+
+    def reset(self):
+        self.index = -1
+
+    def get_next_zone(self):
+        return self.__next__()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.index += 1
+        if self.index >= 1:
+            raise StopIteration
+        return self.object_list
+
+
 class OverlapAgent:
     """The overlap_agent acts to reduce overlap between objects.
 
@@ -211,9 +269,35 @@ class OverlapAgent:
         area_strategy (AreaStrategy): defines how the object in object_list are
         divided into multiple lists, one for each zone
 
+        scoring (str): "step" scores each action with a full space.step(),
+        "geometry" only reindexes the moved body and scores its overlap from
+        the shape geometry, with no dynamics integration, "area" scores
+        the exact overlap area of the shapes instead of the penetration
+        depth. Default="step"
+
+        freeze_margin (float): if given, bodies further than freeze_margin
+        outside the zone being worked on are made static while that zone
+        runs, so space.step() skips them. Default=None
+
+        proposals (ProposalStream): if given, objects, actions, moves and
+        rotations are taken from this stream instead of the global random
+        module. Default=None
+
+        best_of_k (int): with scoring="area", each move or rotation draws
+        best_of_k candidate poses for the chosen object, scores them all in
+        one evaluation and keeps the best if it doesn't increase overlap.
+        Default=1
+
     Attributes:
         self.num_actions (int): as above
         self.time_left (int): starts equal to self.num_actions, is reduced by one for each action taken
+        self.best_snapshot (StateSnapshot): lowest overlap state seen at the
+        end of a zone, None until the first zone has run
+        self.actions_taken, self.actions_rejected (int): running totals over
+        every run() call
+        self.actions_proposed (int): running total of the actions that were
+        moves or rotations, the only ones that can be rejected
+        self.zone_num (int): index of the zone being worked on
 
 
     """
@@ -228,13 +312,57 @@ class OverlapAgent:
         num_actions: int = 1000,
         area_strategy: AreaStrategy = None,
         job_id: int = 0,
+        scoring: str = "step",
+        freeze_margin: float = None,
+        proposals: ProposalStream = None,
+        best_of_k: int = 1,
     ):
         self.num_actions = num_actions
         self.time_left = num_actions
         self.space = space
+        self.object_list = object_list
         self.overlap_distance = 0.0
         self.collision_handler = collision_handler
         self.job_id = job_id
+        self.scoring = scoring
+        if scoring == "geometry":
+            self.geometry_scorer = GeometryScorer(space)
+        elif scoring == "area":
+            # imported here, overlaparea uses analysis which imports Rings
+            from .overlaparea import OverlapAreaObjective
+
+            self.geometry_scorer = OverlapAreaObjective(object_list)
+        else:
+            self.geometry_scorer = None
+        self.freeze_margin = freeze_margin
+        # body -> (body_type, mass, moment) of every frozen object
+        self._frozen = {}
+        self.best_snapshot = None
+        self.proposals = proposals
+        if best_of_k > 1 and scoring != "area":
+            raise ValueError("best_of_k needs scoring='area'")
+        self.best_of_k = best_of_k
+        # candidate draws, seeded from the proposal stream or global random
+        self._rng = None
+        if best_of_k > 1:
+            self._rng = (
+                proposals.rng
+                if proposals is not None
+                else np.random.default_rng(random.getrandbits(64))
+            )
+        # candidate move radius and rotation range, the stream's if given,
+        # else PSIIStructure.move and rotate's defaults
+        self.tether_radius = (
+            1.0 if proposals is None else proposals.tether_radius
+        )
+        self.degree_range = (
+            90.0 if proposals is None else proposals.degree_range
+        )
+        # progress counters, read by a MetricsExporter thread
+        self.actions_taken = 0
+        self.actions_proposed = 0
+        self.actions_rejected = 0
+        self.zone_num = 0
 
         if area_strategy is not None:
             # print(f"using {area_strategy}")
@@ -250,10 +378,35 @@ class OverlapAgent:
     ) -> list:
         """runs the overlap agent through the zone list"""
         overlap_values = []
-        for zone_list in self.area_strategy:
+        for zone_num, zone_list in enumerate(self.area_strategy):
+            self.zone_num = zone_num
+            if self.freeze_margin is not None:
+                self._freeze_outside(
+                    self.area_strategy.active_objects(self.freeze_margin)
+                )
+                # frozen pairs are no longer scored, so the baseline changes
+                self.overlap_distance = self._update_space()
+
             for _ in range(0, num_actions):
-                overlap = self._call_object(object=random.choice(zone_list))
+                if self.proposals is None:
+                    overlap = self._call_object(object=random.choice(zone_list))
+                else:
+                    pick, *proposal = self.proposals.next()
+                    overlap = self._call_object(
+                        object=zone_list[int(pick * len(zone_list))],
+                        proposal=proposal,
+                    )
                 overlap_values.append(overlap)
+                self.actions_taken += 1
+
+            if self.freeze_margin is None:
+                self._track_best()
+
+        if self.freeze_margin is not None:
+            self._freeze_outside(self.object_list)
+            self.overlap_distance = self._update_space()
+            # only the unfrozen overlap is comparable between zones
+            self._track_best()
 
         self.area_strategy.reset()
 
@@ -263,24 +416,171 @@ class OverlapAgent:
             round(sum(overlap_values[-10:-1]) / 10, 2),
         )
 
-    def _call_object(self, object):
+    def _track_best(self):
+        """captures the current state if it has the lowest overlap so far.
+        Called once per zone, since capturing is O(n)"""
+        if (
+            self.best_snapshot is None
+            or self.overlap_distance < self.best_snapshot.overlap
+        ):
+            self.best_snapshot = self.capture_state()
+
+    def capture_state(self) -> StateSnapshot:
+        """returns a snapshot of the positions and angles of all objects"""
+        return StateSnapshot.capture(self.object_list, self.overlap_distance)
+
+    def restore_state(self, snapshot: StateSnapshot) -> float:
+        """puts all objects back to the snapshot state, for example to try
+        another schedule from a forked state, and returns the overlap. The
+        space isn't stepped, which would move the dynamic bodies away from
+        the snapshot, so the overlap is the one captured with it. Only a
+        snapshot without one, which capture_state never makes, is measured
+        again"""
+        snapshot.restore(self.object_list, space=self.space)
+        if self.scoring == "area":
+            self.geometry_scorer.sync()
+        if snapshot.overlap is None:
+            self.overlap_distance = self._update_space()
+        else:
+            self.overlap_distance = snapshot.overlap
+        return self.overlap_distance
+
+    def restore_best(self) -> float:
+        """restores the best state seen so far and returns its overlap"""
+        if self.best_snapshot is None:
+            return self.overlap_distance
+        return self.restore_state(self.best_snapshot)
+
+    def _freeze_outside(self, active_objects: list):
+        """makes every object not in active_objects static, and restores the
+        original body type of active objects that were frozen before"""
+        active = set(active_objects)
+
+        for object in self.object_list:
+            body = object.body
+            if object in active:
+                if body in self._frozen:
+                    body_type, mass, moment = self._frozen.pop(body)
+                    body.body_type = body_type
+                    if body_type == pymunk.Body.DYNAMIC:
+                        # switching to dynamic recomputes the mass from the
+                        # massless shapes, so put the original values back
+                        body.mass = mass
+                        body.moment = moment
+            elif body not in self._frozen:
+                self._frozen[body] = (body.body_type, body.mass, body.moment)
+                body.body_type = pymunk.Body.STATIC
+
+        self.space.reindex_static()
+
+    def _call_object(self, object, proposal: list = None):
         """calls object to perform an action, evaluate it, and either keep it or undo it"""
         if type(object) is not PSIIStructure:
             # print("not a PSIIStructure")
             return
 
-        object.action(random.randint(1, 6))
+        if self.best_of_k > 1:
+            return self._call_object_best_of_k(object, proposal)
+
+        if self.geometry_scorer is not None:
+            return self._call_object_geometry(object, proposal)
+
+        action_num = random.randint(1, 6) if proposal is None else proposal[0]
+        proposed = action_num in [1, 2]
+        if proposed:
+            self.actions_proposed += 1
+        if proposal is None:
+            object.action(action_num)
+        else:
+            object.apply_proposal(*proposal)
 
         new_overlap_distance = self._update_space()
 
         if self.overlap_distance < new_overlap_distance:
             object.undo()
+            if proposed:
+                self.actions_rejected += 1
             new_overlap_distance = self._update_space()
 
         self.overlap_distance = new_overlap_distance
         return self.overlap_distance
 
+    def _call_object_geometry(self, object, proposal: list = None):
+        """_call_object for geometry and area scoring: only the overlap of the acting
+        object changes, so the total is updated by the difference between its
+        overlap before and after the action"""
+        action_num = random.randint(1, 6) if proposal is None else proposal[0]
+        if action_num not in [1, 2]:
+            # actions other than move and rotate leave the object unchanged
+            return self.overlap_distance
+        self.actions_proposed += 1
+
+        old_object_overlap = self.geometry_scorer.object_overlap(object)
+        if proposal is None:
+            object.action(action_num)
+        else:
+            object.apply_proposal(*proposal)
+        self.geometry_scorer.update(object)
+
+        new_overlap_distance = (
+            self.overlap_distance
+            - old_object_overlap
+            + self.geometry_scorer.object_overlap(object)
+        )
+
+        if self.overlap_distance < new_overlap_distance:
+            object.undo()
+            self.actions_rejected += 1
+            self.geometry_scorer.update(object)
+            new_overlap_distance = self.overlap_distance
+
+        self.overlap_distance = new_overlap_distance
+        return self.overlap_distance
+
+    def _call_object_best_of_k(self, object, proposal: list = None):
+        """_call_object for best_of_k > 1: draws best_of_k moves or
+        rotations of object, scores them together against its neighbours and
+        keeps the best one unless it increases the overlap"""
+        action_num = random.randint(1, 6) if proposal is None else proposal[0]
+        if action_num not in [1, 2]:
+            # actions other than move and rotate leave the object unchanged
+            return self.overlap_distance
+        self.actions_proposed += 1
+
+        k = self.best_of_k
+        x, y = object.body.position
+        angle = object.body.angle
+        if action_num == 1:
+            # uniform in the disc of radius tether_radius, as PSIIStructure.move
+            r = self.tether_radius * np.sqrt(self._rng.random(k))
+            t = 2 * math.pi * self._rng.random(k)
+            dx, dy = r * np.cos(t), r * np.sin(t)
+            dangle = np.zeros(k)
+        else:
+            # +/- half of degree_range, as PSIIStructure.rotate
+            dx, dy = np.zeros(k), np.zeros(k)
+            dangle = (self._rng.random(k) * 2 - 1) * (
+                0.5 * self.degree_range * math.pi / 180
+            )
+
+        old_object_overlap = self.geometry_scorer.object_overlap(object)
+        candidates = self.geometry_scorer.candidate_overlaps(
+            object, np.column_stack((x + dx, y + dy)), angle + dangle
+        )
+        best = int(np.argmin(candidates))
+        if candidates[best] > old_object_overlap:
+            self.actions_rejected += 1
+            return self.overlap_distance
+
+        object.apply_proposal(action_num, dx[best], dy[best], dangle[best])
+        self.geometry_scorer.update(object)
+        self.overlap_distance += candidates[best] - old_object_overlap
+        return self.overlap_distance
+
     def _update_space(self):
+        if self.geometry_scorer is not None:
+            return self.geometry_scorer.total_overlap(self.object_list)
+
         self.collision_handler.reset_collision_count()
         self.space.step(0.1)
         return self.collision_handler.overlap_distance
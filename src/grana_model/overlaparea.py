@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""exact overlap area objective
+
+CollisionHandler.log_collision measures overlap as the penetration depth of
+the first contact point of each colliding pair. This module measures the
+area that is actually covered twice: the intersection area of every pair of
+convex sub-shapes of different objects, computed with Sutherland-Hodgman
+clipping batched over all candidate pairs with numpy.
+
+Candidate object pairs come from a cell list over the object centres, using
+each object's bounding radius. The area of every object pair is cached with
+the poses of both objects, and only recomputed once one of the two has moved
+since. The total and the per-object overlap of the agent share the cache.
+
+OverlapAreaObjective has the same interface as GeometryScorer, so the
+OverlapAgent can optimise against it with scoring="area".
+
+Example:
+    $ objective = OverlapAreaObjective(object_list)
+    $ total_area = objective.total_overlap(object_list)
+
+"""
+import numpy as np
+
+from .analysis import pairs_within
+
+
+def _cross(ax, ay, bx, by):
+    return ax * by - ay * bx
+
+
+def polygon_signed_areas(polys: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """signed shoelace area of each padded polygon, using only the first
+    counts vertices of each. Positive for counter-clockwise polygons"""
+    k = polys.shape[1]
+    index = np.arange(k)
+    next_index = np.where(index[None, :] + 1 < counts[:, None], index + 1, 0)
+    next_polys = np.take_along_axis(polys, next_index[..., None], axis=1)
+    terms = _cross(
+        polys[..., 0], polys[..., 1], next_polys[..., 0], next_polys[..., 1]
+    )
+    terms[index[None, :] >= counts[:, None]] = 0.0
+    areas = 0.5 * terms.sum(axis=1)
+    areas[counts < 3] = 0.0
+    return areas
+
+
+def polygon_areas(polys: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """unsigned shoelace area of each padded polygon"""
+    return np.abs(polygon_signed_areas(polys, counts))
+
+
+def clip_areas(
+    subject: np.ndarray,
+    subject_counts: np.ndarray,
+    clip: np.ndarray,
+    clip_counts: np.ndarray,
+) -> np.ndarray:
+    """intersection area of each pair of convex counter-clockwise polygons
+    subject[i] and clip[i], by Sutherland-Hodgman clipping of all pairs at
+    once. Polygons are padded arrays with their vertex counts given"""
+    num_pairs = len(subject)
+    if num_pairs == 0:
+        return np.empty(0)
+
+    capacity = subject.shape[1] + clip.shape[1]
+    rows = np.arange(num_pairs)[:, None]
+    poly = np.zeros((num_pairs, capacity, 2))
+    poly[:, : subject.shape[1]] = subject
+    counts = subject_counts.copy()
+
+    for edge in range(clip.shape[1]):
+        active = (edge < clip_counts) & (counts > 0)
+        if not active.any():
+            break
+
+        p0 = clip[:, edge]
+        p1 = clip[rows[:, 0], np.where(edge + 1 < clip_counts, edge + 1, 0)]
+        ex, ey = (p1 - p0).T
+
+        index = np.arange(capacity)
+        prev_index = np.where(index[None, :] == 0, counts[:, None] - 1, index - 1)
+        prev_index = np.clip(prev_index, 0, capacity - 1)
+        cur = poly
+        prev = poly[rows, prev_index]
+
+        side_cur = _cross(
+            ex[:, None], ey[:, None],
+            cur[..., 0] - p0[:, None, 0], cur[..., 1] - p0[:, None, 1],
+        )
+        side_prev = _cross(
+            ex[:, None], ey[:, None],
+            prev[..., 0] - p0[:, None, 0], prev[..., 1] - p0[:, None, 1],
+        )
+        in_poly = index[None, :] < counts[:, None]
+        cur_in = side_cur >= 0
+        prev_in = side_prev >= 0
+        crossing = (cur_in != prev_in) & in_poly
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(crossing, side_prev / (side_prev - side_cur), 0.0)
+        intersection = prev + t[..., None] * (cur - prev)
+
+        # every input vertex emits up to two output vertices, in order: the
+        # crossing point into or out of the half-plane, then itself if inside
+        out = np.empty((num_pairs, 2 * capacity, 2))
+        out[:, 0::2] = intersection
+        out[:, 1::2] = cur
+        valid = np.empty((num_pairs, 2 * capacity), dtype=bool)
+        valid[:, 0::2] = crossing
+        valid[:, 1::2] = cur_in & in_poly
+
+        order = np.argsort(~valid, axis=1, kind="stable")[:, :capacity]
+        new_poly = np.take_along_axis(out, order[..., None], axis=1)
+        new_counts = np.minimum(valid.sum(axis=1), capacity)
+
+        poly = np.where(active[:, None, None], new_poly, poly)
+        counts = np.where(active, new_counts, counts)
+
+    return polygon_areas(poly, counts)
+
+
+class OverlapAreaObjective:
+    """total pairwise overlap area of the shapes of object_list
+
+    Parameters:
+        object_list (list of PSIIStructure): the objects to score, in the
+        order of their index attribute
+    """
+
+    def __init__(self, object_list: list):
+        self.object_list = object_list
+        n = len(object_list)
+
+        local, owners = [], []
+        for obj_num, obj in enumerate(object_list):
+            for shape in obj.shapes:
+                local.append([(v.x, v.y) for v in shape.get_vertices()])
+                owners.append(obj_num)
+
+        self.poly_counts = np.array([len(verts) for verts in local], dtype=int)
+        self.poly_owner = np.array(owners, dtype=int)
+        self.poly_local = np.zeros((len(local), max(self.poly_counts, default=3), 2))
+        for poly_num, verts in enumerate(local):
+            self.poly_local[poly_num, : len(verts)] = verts
+            self.poly_local[poly_num, len(verts) :] = verts[-1]
+
+        # clipping needs counter-clockwise winding
+        clockwise = polygon_signed_areas(self.poly_local, self.poly_counts) < 0
+        for poly_num in np.flatnonzero(clockwise):
+            count = self.poly_counts[poly_num]
+            self.poly_local[poly_num, :count] = self.poly_local[
+                poly_num, count - 1 :: -1
+            ]
+
+        # polygons of each object are contiguous, poly_start[i]:poly_start[i+1]
+        self.poly_start = np.zeros(n + 1, dtype=int)
+        np.cumsum(np.bincount(self.poly_owner, minlength=n), out=self.poly_start[1:])
+
+        self.radius = np.zeros(n)
+        np.maximum.at(
+            self.radius,
+            self.poly_owner,
+            np.hypot(self.poly_local[..., 0], self.poly_local[..., 1]).max(axis=1),
+        )
+
+        self.positions = np.zeros((n, 2))
+        self.angles = np.zeros(n)
+        self.sync()
+
+        # per object pair cache, sorted by key a * n + b with a < b, with the
+        # (x, y, angle) of a and of b the area was computed at
+        self._cache_keys = np.empty(0, dtype=np.int64)
+        self._cache_areas = np.empty(0)
+        self._cache_poses = np.empty((0, 6))
+
+    def sync(self):
+        """reads the position and angle of every body"""
+        for obj_num, obj in enumerate(self.object_list):
+            self.positions[obj_num] = tuple(obj.body.position)
+            self.angles[obj_num] = obj.body.angle
+
+    def update(self, obj):
+        """reads the position and angle of obj after it has moved"""
+        self.positions[obj.index] = tuple(obj.body.position)
+        self.angles[obj.index] = obj.body.angle
+
+    def _world_polygons(self, poly_ids: np.ndarray) -> np.ndarray:
+        owners = self.poly_owner[poly_ids]
+        cos_a = np.cos(self.angles[owners])[:, None]
+        sin_a = np.sin(self.angles[owners])[:, None]
+        x = self.poly_local[poly_ids, :, 0]
+        y = self.poly_local[poly_ids, :, 1]
+        world = np.stack((x * cos_a - y * sin_a, x * sin_a + y * cos_a), axis=-1)
+        return world + self.positions[owners][:, None, :]
+
+    def _pair_areas(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """overlap area of each object pair (a[i], b[i])"""
+        count_a = self.poly_start[a + 1] - self.poly_start[a]
+        count_b = self.poly_start[b + 1] - self.poly_start[b]
+        per_pair = count_a * count_b
+
+        pair_num = np.repeat(np.arange(len(a)), per_pair)
+        within = np.arange(per_pair.sum()) - np.repeat(
+            np.cumsum(per_pair) - per_pair, per_pair
+        )
+        poly_a = self.poly_start[a][pair_num] + within // count_b[pair_num]
+        poly_b = self.poly_start[b][pair_num] + within % count_b[pair_num]
+
+        # transform each polygon once, then drop the polygon pairs whose
+        # bounding boxes don't touch before gathering any vertices
+        poly_ids, slot = np.unique(
+            np.concatenate((poly_a, poly_b)), return_inverse=True
+        )
+        slot_a, slot_b = slot[: len(poly_a)], slot[len(poly_a) :]
+        world = self._world_polygons(poly_ids)
+        lower, upper = world.min(axis=1), world.max(axis=1)
+        touching = np.all(
+            (lower[slot_a] <= upper[slot_b]) & (lower[slot_b] <= upper[slot_a]),
+            axis=1,
+        )
+        areas = np.zeros(len(a))
+        np.add.at(
+            areas,
+            pair_num[touching],
+            clip_areas(
+                world[slot_a[touching]],
+                self.poly_counts[poly_a[touching]],
+                world[slot_b[touching]],
+                self.poly_counts[poly_b[touching]],
+            ),
+        )
+        return areas
+
+    def _candidate_pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        i, j, distance = pairs_within(self.positions, 2 * self.radius.max())
+        close = distance < self.radius[i] + self.radius[j]
+        a = np.minimum(i[close], j[close])
+        b = np.maximum(i[close], j[close])
+        return a, b
+
+    def _poses(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        return np.column_stack(
+            (self.positions[a], self.angles[a], self.positions[b], self.angles[b])
+        )
+
+    def _cached_pair_areas(
+        self, a: np.ndarray, b: np.ndarray, prune: bool = False
+    ) -> np.ndarray:
+        """overlap area of each object pair (a[i], b[i]), with a < b and the
+        pairs sorted by key. Areas cached at the current poses of both objects
+        are reused, the rest are computed and written back. With prune the
+        cache is left holding only these pairs"""
+        keys = a.astype(np.int64) * len(self.object_list) + b
+        poses = self._poses(a, b)
+
+        areas = np.zeros(len(keys))
+        found = np.zeros(len(keys), dtype=bool)
+        slot = np.zeros(len(keys), dtype=int)
+        if len(self._cache_keys) > 0:
+            slot = np.minimum(
+                np.searchsorted(self._cache_keys, keys), len(self._cache_keys) - 1
+            )
+            found = self._cache_keys[slot] == keys
+        fresh = found.copy()
+        fresh[found] = np.all(self._cache_poses[slot[found]] == poses[found], axis=1)
+        areas[fresh] = self._cache_areas[slot[fresh]]
+
+        stale = ~fresh
+        areas[stale] = self._pair_areas(a[stale], b[stale])
+
+        if prune:
+            self._cache_keys, self._cache_areas, self._cache_poses = (
+                keys,
+                areas,
+                poses,
+            )
+            return areas
+
+        update = found & stale
+        self._cache_areas[slot[update]] = areas[update]
+        self._cache_poses[slot[update]] = poses[update]
+        if not found.all():
+            at = np.searchsorted(self._cache_keys, keys[~found])
+            self._cache_keys = np.insert(self._cache_keys, at, keys[~found])
+            self._cache_areas = np.insert(self._cache_areas, at, areas[~found])
+            self._cache_poses = np.insert(
+                self._cache_poses, at, poses[~found], axis=0
+            )
+        return areas
+
+    def pair_overlaps(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """returns every overlapping object pair and its area, reusing cached
+        areas of pairs where neither object has moved"""
+        self.sync()
+        n = len(self.object_list)
+        a, b = self._candidate_pairs()
+        order = np.argsort(a.astype(np.int64) * n + b)
+        a, b = a[order], b[order]
+
+        return a, b, self._cached_pair_areas(a, b, prune=True)
+
+    def total_overlap(self, object_list: list = None) -> float:
+        """total overlap area over all object pairs"""
+        return float(self.pair_overlaps()[2].sum())
+
+    def per_object_overlap(self) -> np.ndarray:
+        """overlap area of each object with all others, indexed like
+        object_list"""
+        a, b, areas = self.pair_overlaps()
+        per_object = np.zeros(len(self.object_list))
+        np.add.at(per_object, a, areas)
+        np.add.at(per_object, b, areas)
+        return per_object
+
+    def neighbours(self, obj_num: int) -> np.ndarray:
+        """indices of the objects whose bounding circles touch obj_num's"""
+        distance = np.hypot(*(self.positions - self.positions[obj_num]).T)
+        close = distance < self.radius + self.radius[obj_num]
+        close[obj_num] = False
+        return np.flatnonzero(close)
+
+    def candidate_overlaps(
+        self, obj, positions: np.ndarray, angles: np.ndarray
+    ) -> np.ndarray:
+        """overlap area between obj and all other objects for each of K
+        candidate poses (positions[k], angles[k]) of obj, evaluated together
+        against the neighbours of the region the candidates span"""
+        obj_num = obj.index
+        reach = np.max(np.hypot(*(positions - self.positions[obj_num]).T))
+        distance = np.hypot(*(self.positions - self.positions[obj_num]).T)
+        close = distance < self.radius + self.radius[obj_num] + reach
+        close[obj_num] = False
+        others = np.flatnonzero(close)
+        overlaps = np.zeros(len(positions))
+        if len(others) == 0:
+            return overlaps
+
+        # the obj polygons at every candidate pose, (K * Pa, V, 2)
+        own = np.arange(self.poly_start[obj_num], self.poly_start[obj_num + 1])
+        local = self.poly_local[own]
+        cos_a = np.cos(angles)[:, None, None]
+        sin_a = np.sin(angles)[:, None, None]
+        x, y = local[None, ..., 0], local[None, ..., 1]
+        candidate_polys = np.stack(
+            (
+                x * cos_a - y * sin_a + positions[:, None, None, 0],
+                x * sin_a + y * cos_a + positions[:, None, None, 1],
+            ),
+            axis=-1,
+        ).reshape(-1, local.shape[1], 2)
+        candidate_num = np.repeat(np.arange(len(positions)), len(own))
+        candidate_counts = np.tile(self.poly_counts[own], len(positions))
+
+        neighbour_ids = np.concatenate(
+            [np.arange(self.poly_start[i], self.poly_start[i + 1]) for i in others]
+        )
+        neighbour_polys = self._world_polygons(neighbour_ids)
+
+        lower_a, upper_a = candidate_polys.min(axis=1), candidate_polys.max(axis=1)
+        lower_b, upper_b = neighbour_polys.min(axis=1), neighbour_polys.max(axis=1)
+        touching = np.all(
+            (lower_a[:, None] <= upper_b[None, :])
+            & (lower_b[None, :] <= upper_a[:, None]),
+            axis=2,
+        )
+        pair_a, pair_b = np.nonzero(touching)
+
+        np.add.at(
+            overlaps,
+            candidate_num[pair_a],
+            clip_areas(
+                candidate_polys[pair_a],
+                candidate_counts[pair_a],
+                neighbour_polys[pair_b],
+                self.poly_counts[neighbour_ids[pair_b]],
+            ),
+        )
+        return overlaps
+
+    def object_overlap(self, obj) -> float:
+        """overlap area between obj and all other objects, from the positions
+        last read by sync() or update(). Reuses the cached area of every pair
+        where neither object has moved"""
+        others = self.neighbours(obj.index)
+        if len(others) == 0:
+            return 0.0
+        # neighbours are sorted, so the keys are too
+        a = np.minimum(others, obj.index)
+        b = np.maximum(others, obj.index)
+        return float(self._cached_pair_areas(a, b).sum())
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""per-object overlap attribution and overlap maps
+
+An OverlapMap breaks the total overlap of one evaluation down three ways:
+    per_object: the overlap of every object, indexed like object_list. Each
+        colliding pair gives half of its depth to each of its two objects,
+        so per_object sums to the total
+    heatmap: overlap depth binned by contact point into a resolution x
+        resolution grid over bounds, row 0 at y_min
+    type_pairs: overlap depth between every pair of OBJECT_TYPES, symmetric
+
+Attached to a CollisionHandler as collision_handler.overlap_map, it records
+every collision pre_solve sees, and is reset with the collision count, so it
+always describes the last space.step(). Scoring modes that don't step the
+space can fill it with measure(), which finds the same contacts with shape
+queries.
+
+Overlap is measured as in CollisionHandler.log_collision, from the first
+contact point of each pair.
+
+Example:
+    $ overlap_map = OverlapMap(object_list)
+    $ collision_handler.overlap_map = overlap_map
+    $ ...
+    $ overlap_map.write(Path("output") / "step_10")
+
+"""
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from .objectdata import OBJECT_TYPES
+
+
+class OverlapMap:
+    """Parameters:
+        object_list (list of PSIIStructure): the objects overlap is
+        attributed to, in the order of their index attribute
+        bounds (tuple): (x_min, y_min, x_max, y_max) covered by the heatmap,
+        contacts outside it are left out of the heatmap only
+        resolution (int): heatmap cells along each side, the defaults give
+        50 x 50 cells of 10 units
+    """
+
+    def __init__(
+        self,
+        object_list: list,
+        bounds: tuple = (-50.0, -50.0, 450.0, 450.0),
+        resolution: int = 50,
+    ):
+        self.object_list = object_list
+        self.bounds = bounds
+        self.resolution = resolution
+        self.cell_size = (
+            (bounds[2] - bounds[0]) / resolution,
+            (bounds[3] - bounds[1]) / resolution,
+        )
+        self.body_index = {obj.body: i for i, obj in enumerate(object_list)}
+        self.type_codes = [obj.type_code for obj in object_list]
+
+        self.per_object = np.zeros(len(object_list))
+        self.heatmap = np.zeros((resolution, resolution))
+        self.type_pairs = np.zeros((len(OBJECT_TYPES), len(OBJECT_TYPES)))
+
+    def reset(self):
+        self.per_object[:] = 0
+        self.heatmap[:] = 0
+        self.type_pairs[:] = 0
+
+    def record(self, body_a, body_b, contact_set, weight: float = 1.0):
+        """attributes the overlap of one colliding pair"""
+        if not contact_set.points:
+            return
+        point = contact_set.points[0]
+        if point.distance >= 0:
+            return
+        depth = -point.distance * weight
+
+        index_a = self.body_index.get(body_a)
+        index_b = self.body_index.get(body_b)
+        if index_a is not None:
+            self.per_object[index_a] += 0.5 * depth
+        if index_b is not None:
+            self.per_object[index_b] += 0.5 * depth
+
+        col = int((point.point_a.x - self.bounds[0]) // self.cell_size[0])
+        row = int((point.point_a.y - self.bounds[1]) // self.cell_size[1])
+        if 0 <= row < self.resolution and 0 <= col < self.resolution:
+            self.heatmap[row, col] += depth
+
+        if index_a is not None and index_b is not None:
+            type_a = self.type_codes[index_a]
+            type_b = self.type_codes[index_b]
+            self.type_pairs[type_a, type_b] += depth
+            if type_a != type_b:
+                self.type_pairs[type_b, type_a] += depth
+
+    def measure(self, space):
+        """fills the map from the current positions with shape queries,
+        without stepping the space. Every pair is found from both sides, so
+        each side records half. Bodies moved without a step still have their
+        old bounding boxes and vertices in the space, so every body is
+        reindexed first"""
+        self.reset()
+        for obj in self.object_list:
+            space.reindex_shapes_for_body(obj.body)
+        for obj in self.object_list:
+            for shape in obj.shapes:
+                for info in space.shape_query(shape):
+                    other = info.shape
+                    if other.body is obj.body or other.collision_type != 1:
+                        continue
+                    self.record(
+                        obj.body, other.body, info.contact_point_set, weight=0.5
+                    )
+
+    def copy_maps(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """returns copies of per_object, heatmap and type_pairs, for handing
+        to another thread"""
+        return (
+            self.per_object.copy(),
+            self.heatmap.copy(),
+            self.type_pairs.copy(),
+        )
+
+    def write(self, stem):
+        """writes {stem}_heatmap.csv and {stem}_type_pairs.csv"""
+        write_maps(stem, self.heatmap, self.type_pairs)
+
+
+def write_maps(stem, heatmap: np.ndarray, type_pairs: np.ndarray):
+    """writes a heatmap as a grid csv, row 0 at y_min, and the type pair
+    matrix as a csv labelled with OBJECT_TYPES"""
+    stem = Path(stem)
+    with open(f"{stem}_heatmap.csv", "w", newline="") as f:
+        csv.writer(f).writerows(np.round(heatmap, 3).tolist())
+
+    with open(f"{stem}_type_pairs.csv", "w", newline="") as f:
+        write = csv.writer(f)
+        write.writerow(["type", *OBJECT_TYPES])
+        for obj_type, row in zip(OBJECT_TYPES, np.round(type_pairs, 3).tolist()):
+            write.writerow([obj_type, *row])
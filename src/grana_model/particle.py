@@ -1,32 +1,22 @@
 import pymunk
-from math import degrees
 
 
-class Particle(pymunk.Body):
+class Particle:
+    """a diffusing particle: one dynamic pymunk Body with a Circle shape.
+    Uses __slots__ and wraps a single Body rather than also being one"""
+
+    __slots__ = ("body", "shape")
+
+    max_movement = 1
+    diffusion_distance = 10
+
     def __init__(self, space, pos, batch, particle_radius=1.5):
-        self.max_movement = 1
         self.body = pymunk.Body(0, 0, body_type=pymunk.Body.DYNAMIC)
         c1 = pymunk.Circle(self.body, particle_radius)
         c1.color = (255, 0, 0, 255)
         self.shape = c1
         self.body.position = pos
         space.add(self.body, c1)
-        self.diffusion_distance = 10
-
-        self.img = None
-        # TODO: get a better sprite
-        # img.anchor_x = img.width // 2
-        # img.anchor_y = img.height // 2
-
-        # self.sprite = sprite.Sprite(
-        #     img, x=self.body.position.x, y=self.body.position.y, batch=batch
-        # )
-        # self.sprite.scale = 0.003
-        # self.sprite.color = (255, 255, 255)
-        # self.sprite.rotation = degrees(-self.body.angle)
-
-        # create the sprite
-        self._assign_sprite(batch=batch)
 
     @property
     def area(self):
@@ -41,13 +31,6 @@ class Particle(pymunk.Body):
     def __call__(self):
         return self.shape
 
-    def update_sprite(self, sprite_scale_factor, rotation_factor):
-        self.sprite.rotation = degrees(-self.body.angle) + rotation_factor
-        self.sprite.position = self.body.position
-        if self.sprite.scale == sprite_scale_factor:
-            return
-        self.sprite.scale = sprite_scale_factor
-
     def diffusion_move(self, diffusion_distance, **kwargs):
         pass
         # ''' generates movement in a random direction, up to 1 nm per timestep, which represents 12.5ns of time passed'''
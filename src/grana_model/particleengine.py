@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""vectorized Brownian particle engine
+
+This module simulates diffusing particles as an N x 2 numpy array instead of
+one pymunk Body per particle. Each timestep draws all Brownian displacements in
+one call, and proposed positions that fall inside a PSII shape or outside the
+grana disc are rejected, leaving that particle where it was.
+
+Obstacles are the convex shapes of the spawned PSIIStructures, frozen at the
+time the engine is built. They are indexed with a cell list: every cell holds
+the polygons whose bounding boxes touch it, so a particle is only tested
+against the few polygons in its own cell. Cells default to the mean polygon
+extent; the compound shapes are mostly about 1 unit across, so much larger
+cells hold dozens of polygons each. Particle/polygon pairs are tested in
+chunks of at most PAIRS_PER_CHUNK, which bounds the memory of a step.
+
+Example:
+    $ obstacles = ObstacleIndex.from_objects(object_list)
+    $ engine = ParticleEngine(100000, obstacles, rng=np.random.default_rng(1))
+    $ engine.step(num_steps=1000)
+
+"""
+import numpy as np
+
+# particle/polygon pairs tested at once, bounds the memory of inside_any
+PAIRS_PER_CHUNK = 1 << 20
+
+
+def polygons_from_objects(object_list: list) -> tuple[np.ndarray, np.ndarray]:
+    """returns the world coordinates of every shape of every object, padded to
+    the largest vertex count by repeating the last vertex, as a (P, V, 2)
+    array, along with the real vertex count of each polygon"""
+    local_verts, positions, angles = [], [], []
+    for obj in object_list:
+        for shape in obj.shapes:
+            local_verts.append([(v.x, v.y) for v in shape.get_vertices()])
+            positions.append(tuple(obj.body.position))
+            angles.append(obj.body.angle)
+
+    if not local_verts:
+        return np.empty((0, 3, 2)), np.empty(0, dtype=int)
+
+    counts = np.array([len(verts) for verts in local_verts])
+    polygons = np.empty((len(local_verts), counts.max(), 2))
+    for poly_num, verts in enumerate(local_verts):
+        polygons[poly_num, : len(verts)] = verts
+        polygons[poly_num, len(verts) :] = verts[-1]
+
+    cos_a, sin_a = np.cos(angles)[:, None], np.sin(angles)[:, None]
+    x, y = polygons[..., 0], polygons[..., 1]
+    world = np.stack((x * cos_a - y * sin_a, x * sin_a + y * cos_a), axis=-1)
+    world += np.asarray(positions)[:, None, :]
+
+    # the inside test needs counter-clockwise winding
+    signed_area = np.sum(
+        world[..., 0] * np.roll(world[..., 1], -1, axis=1)
+        - np.roll(world[..., 0], -1, axis=1) * world[..., 1],
+        axis=1,
+    )
+    world[signed_area < 0] = world[signed_area < 0, ::-1]
+
+    return world, counts
+
+
+class ObstacleIndex:
+    """a cell list over convex polygons, answering which points lie inside
+    any of them. cell_size defaults to the mean polygon bounding box
+    extent"""
+
+    def __init__(self, polygons: np.ndarray, cell_size: float = None):
+        self.polygons = polygons
+        if cell_size is None:
+            cell_size = (
+                float(np.mean(polygons.max(axis=1) - polygons.min(axis=1)))
+                if len(polygons) > 0
+                else 10.0
+            )
+        self.cell_size = cell_size
+
+        if len(polygons) == 0:
+            self.origin = np.zeros(2)
+            self.shape = (1, 1)
+            self.cell_start = np.zeros(2, dtype=int)
+            self.cell_polygons = np.empty(0, dtype=int)
+            return
+
+        bb_min = polygons.min(axis=1)
+        bb_max = polygons.max(axis=1)
+        self.origin = bb_min.min(axis=0)
+        lo = np.floor((bb_min - self.origin) / cell_size).astype(int)
+        hi = np.floor((bb_max - self.origin) / cell_size).astype(int)
+        self.shape = tuple(hi.max(axis=0) + 1)
+
+        cells, owners = [], []
+        for poly_num, ((x0, y0), (x1, y1)) in enumerate(zip(lo, hi)):
+            gx, gy = np.meshgrid(np.arange(x0, x1 + 1), np.arange(y0, y1 + 1))
+            cells.append((gy * self.shape[0] + gx).ravel())
+            owners.append(np.full(gx.size, poly_num))
+        cells = np.concatenate(cells)
+        owners = np.concatenate(owners)
+
+        order = np.argsort(cells, kind="stable")
+        self.cell_polygons = owners[order]
+        num_cells = self.shape[0] * self.shape[1]
+        self.cell_start = np.zeros(num_cells + 1, dtype=int)
+        np.cumsum(np.bincount(cells, minlength=num_cells), out=self.cell_start[1:])
+
+    @classmethod
+    def from_objects(cls, object_list: list, cell_size: float = None):
+        polygons, _ = polygons_from_objects(object_list)
+        return cls(polygons, cell_size=cell_size)
+
+    def inside_any(self, points: np.ndarray) -> np.ndarray:
+        """returns a mask of the points that are inside any polygon"""
+        inside = np.zeros(len(points), dtype=bool)
+        cell_xy = np.floor((points - self.origin) / self.cell_size).astype(int)
+        in_grid = np.all((cell_xy >= 0) & (cell_xy < self.shape), axis=1)
+
+        point_ids = np.flatnonzero(in_grid)
+        cells = cell_xy[in_grid, 1] * self.shape[0] + cell_xy[in_grid, 0]
+        start = self.cell_start[cells]
+        counts = self.cell_start[cells + 1] - start
+
+        # chunks of points with a bounded number of pairs
+        chunk_ids = np.cumsum(counts) // PAIRS_PER_CHUNK
+        bounds = np.flatnonzero(np.diff(chunk_ids)) + 1
+        for chunk in np.split(np.arange(len(point_ids)), bounds):
+            self._test_pairs(
+                points, point_ids[chunk], start[chunk], counts[chunk], inside
+            )
+        return inside
+
+    def _test_pairs(self, points, point_ids, start, counts, inside):
+        """marks the points of point_ids that are inside one of the counts
+        polygons of their cell, which start at start in cell_polygons"""
+        pair_points = np.repeat(point_ids, counts)
+        if len(pair_points) == 0:
+            return
+        pair_polygons = self.cell_polygons[
+            np.arange(counts.sum())
+            - np.repeat(np.cumsum(counts) - counts, counts)
+            + np.repeat(start, counts)
+        ]
+
+        verts = self.polygons[pair_polygons]
+        edges = np.roll(verts, -1, axis=1) - verts
+        rel = points[pair_points, None, :] - verts
+        cross = edges[..., 0] * rel[..., 1] - edges[..., 1] * rel[..., 0]
+        pair_inside = np.all(cross >= 0, axis=1)
+
+        inside[pair_points[pair_inside]] = True
+
+
+class ParticleEngine:
+    """Brownian particles in the grana disc, excluded from the obstacles
+
+    Parameters:
+        num_particles (int): number of particles
+        obstacles (ObstacleIndex): polygons the particles can't enter
+        center, radius: the grana disc the particles are confined to
+        step_sigma (float): standard deviation of each displacement
+        component per timestep, sqrt(2 * D * dt)
+        rng (np.random.Generator): source of all random draws
+    """
+
+    def __init__(
+        self,
+        num_particles: int,
+        obstacles: ObstacleIndex,
+        center: tuple[float, float] = (200, 200),
+        radius: float = 200.0,
+        step_sigma: float = 1.0,
+        rng: np.random.Generator = None,
+    ):
+        self.obstacles = obstacles
+        self.center = np.asarray(center, dtype=float)
+        self.radius = radius
+        self.step_sigma = step_sigma
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.time = 0
+        self.accepted_moves = 0
+        self.positions = self._place(num_particles)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _place(self, num_particles: int) -> np.ndarray:
+        """uniform random positions in the disc, outside every obstacle"""
+        positions = np.empty((num_particles, 2))
+        todo = np.arange(num_particles)
+        while len(todo) > 0:
+            r = self.radius * np.sqrt(self.rng.random(len(todo)))
+            t = 2 * np.pi * self.rng.random(len(todo))
+            positions[todo] = self.center + np.column_stack(
+                (r * np.cos(t), r * np.sin(t))
+            )
+            todo = todo[self.obstacles.inside_any(positions[todo])]
+        return positions
+
+    def allowed(self, points: np.ndarray) -> np.ndarray:
+        """returns a mask of the points inside the disc and outside every
+        obstacle"""
+        in_disc = (
+            np.sum((points - self.center) ** 2, axis=1) < self.radius ** 2
+        )
+        allowed = in_disc.copy()
+        allowed[in_disc] = ~self.obstacles.inside_any(points[in_disc])
+        return allowed
+
+    def step(self, num_steps: int = 1, callback=None):
+        """advances all particles num_steps timesteps. If callback is given it
+        is called with the engine after every timestep"""
+        for _ in range(num_steps):
+            proposed = self.positions + self.rng.normal(
+                0.0, self.step_sigma, self.positions.shape
+            )
+            allowed = self.allowed(proposed)
+            self.positions[allowed] = proposed[allowed]
+            self.accepted_moves += int(allowed.sum())
+            self.time += 1
+
+            if callback is not None:
+                callback(self)
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""streaming particle statistics
+
+This module accumulates diffusion statistics for a ParticleEngine as it runs,
+in memory that doesn't grow with the number of timesteps, so full trajectories
+never have to be stored.
+
+MultiTauMSD:
+    mean squared displacement over lag times spaced on a multi-tau scheme.
+    Level k keeps the last points_per_level positions sampled every 2**k
+    steps, so lags from 1 step up to points_per_level * 2**(num_levels - 1)
+    steps are covered. Memory is num_levels * points_per_level * N * 2 floats.
+
+FirstPassage:
+    histograms of the first time each particle gets further than each of a
+    set of radii from its starting point, kept separately for every Rings
+    band the particle started in. Memory is N * len(radii) bools plus the
+    fixed-size histograms.
+
+Example:
+    $ recorder = StatsRecorder(engine, radii=[5, 10, 20], out_prefix="run1")
+    $ engine.step(num_steps=10000, callback=recorder)
+    $ recorder.export()
+
+"""
+import csv
+
+import numpy as np
+
+from .overlapagent import Rings
+
+
+class MultiTauMSD:
+    def __init__(
+        self,
+        positions: np.ndarray,
+        points_per_level: int = 8,
+        num_levels: int = 8,
+        dtype=np.float32,
+    ):
+        self.m = points_per_level
+        self.num_levels = num_levels
+        num_particles = len(positions)
+        self.buffers = np.empty(
+            (num_levels, points_per_level, num_particles, 2), dtype=dtype
+        )
+        self.num_samples = np.zeros(num_levels, dtype=int)
+        self.msd_sum = np.zeros((num_levels, points_per_level))
+        self.msd_count = np.zeros((num_levels, points_per_level))
+        self.time = 0
+        self._store(positions)
+
+    def _lags(self, level: int) -> range:
+        # higher levels skip the lags already covered by the level below
+        return range(1, self.m) if level == 0 else range(self.m // 2, self.m)
+
+    def _store(self, positions: np.ndarray):
+        for level in range(self.num_levels):
+            if self.time % (1 << level) != 0:
+                break
+            slot = self.num_samples[level] % self.m
+            self.buffers[level, slot] = positions
+            self.num_samples[level] += 1
+
+    def update(self, positions: np.ndarray):
+        """adds the positions after one more timestep"""
+        self.time += 1
+        for level in range(self.num_levels):
+            if self.time % (1 << level) != 0:
+                break
+            slot = self.num_samples[level] % self.m
+            for lag in self._lags(level):
+                if lag > self.num_samples[level]:
+                    break
+                previous = self.buffers[level, (slot - lag) % self.m]
+                self.msd_sum[level, lag] += np.sum(
+                    (positions - previous) ** 2, dtype=np.float64
+                )
+                self.msd_count[level, lag] += len(positions)
+        self._store(positions)
+
+    def results(self) -> tuple[np.ndarray, np.ndarray]:
+        """returns the lag times in steps and the msd at each lag"""
+        lag_times, msd = [], []
+        for level in range(self.num_levels):
+            for lag in self._lags(level):
+                if self.msd_count[level, lag] > 0:
+                    lag_times.append(lag << level)
+                    msd.append(
+                        self.msd_sum[level, lag] / self.msd_count[level, lag]
+                    )
+        return np.array(lag_times), np.array(msd)
+
+
+class FirstPassage:
+    def __init__(
+        self,
+        positions: np.ndarray,
+        radii: list,
+        center: tuple[float, float] = (200, 200),
+        max_time: int = 100000,
+        num_bins: int = 50,
+    ):
+        self.start = positions.copy()
+        self.radii_sq = np.asarray(radii, dtype=float) ** 2
+        self.radii = list(radii)
+        self.bands = Rings.zone_distances[:-1]
+
+        start_radius = np.hypot(*(positions - np.asarray(center)).T)
+        self.band = np.full(len(positions), len(self.bands) - 1)
+        for band_num, (inner, outer) in reversed(list(enumerate(self.bands))):
+            self.band[(start_radius >= inner) & (start_radius < outer)] = band_num
+
+        self.reached = np.zeros((len(positions), len(radii)), dtype=bool)
+        self.bin_edges = np.unique(
+            np.geomspace(1, max_time + 1, num_bins + 1).astype(int)
+        )
+        self.histogram = np.zeros(
+            (len(self.bands), len(radii), len(self.bin_edges) - 1), dtype=int
+        )
+        self.time = 0
+
+    def update(self, positions: np.ndarray):
+        """adds the positions after one more timestep"""
+        self.time += 1
+        distance_sq = np.sum((positions - self.start) ** 2, axis=1)
+        time_bin = min(
+            np.searchsorted(self.bin_edges, self.time, side="right") - 1,
+            len(self.bin_edges) - 2,
+        )
+        for radius_num, radius_sq in enumerate(self.radii_sq):
+            newly = ~self.reached[:, radius_num] & (distance_sq >= radius_sq)
+            if newly.any():
+                np.add.at(
+                    self.histogram[:, radius_num, time_bin], self.band[newly], 1
+                )
+                self.reached[:, radius_num] |= newly
+
+    def not_reached(self) -> np.ndarray:
+        """returns the number of particles per band and radius that haven't
+        passed the radius yet"""
+        return np.stack(
+            [
+                np.bincount(
+                    self.band[~self.reached[:, radius_num]],
+                    minlength=len(self.bands),
+                )
+                for radius_num in range(len(self.radii))
+            ],
+            axis=1,
+        )
+
+
+class StatsRecorder:
+    """engine.step callback that feeds an MSD and a first passage accumulator,
+    and optionally exports them every export_every steps"""
+
+    def __init__(
+        self,
+        engine,
+        radii: list = (5.0, 10.0, 20.0, 40.0),
+        out_prefix: str = "particles",
+        export_every: int = 0,
+        points_per_level: int = 8,
+        num_levels: int = 8,
+        max_time: int = 100000,
+    ):
+        self.msd = MultiTauMSD(
+            engine.positions,
+            points_per_level=points_per_level,
+            num_levels=num_levels,
+        )
+        self.first_passage = FirstPassage(
+            engine.positions,
+            radii=radii,
+            center=engine.center,
+            max_time=max_time,
+        )
+        self.out_prefix = out_prefix
+        self.export_every = export_every
+
+    def __call__(self, engine):
+        self.msd.update(engine.positions)
+        self.first_passage.update(engine.positions)
+        if self.export_every and self.msd.time % self.export_every == 0:
+            self.export()
+
+    def export(self):
+        """writes {out_prefix}_msd.csv and {out_prefix}_fpt.csv"""
+        lag_times, msd = self.msd.results()
+        with open(f"{self.out_prefix}_msd.csv", "w", newline="") as f:
+            write = csv.writer(f)
+            write.writerow(["lag_steps", "msd"])
+            write.writerows(zip(lag_times.tolist(), msd.round(5).tolist()))
+
+        fpt = self.first_passage
+        not_reached = fpt.not_reached()
+        with open(f"{self.out_prefix}_fpt.csv", "w", newline="") as f:
+            write = csv.writer(f)
+            write.writerow(
+                ["band", "radius", "bin_start", "bin_end", "count", "not_reached"]
+            )
+            for band_num, (inner, outer) in enumerate(fpt.bands):
+                for radius_num, radius in enumerate(fpt.radii):
+                    for bin_num in range(len(fpt.bin_edges) - 1):
+                        write.writerow(
+                            [
+                                f"{inner:g}_{outer:g}",
+                                radius,
+                                fpt.bin_edges[bin_num],
+                                fpt.bin_edges[bin_num + 1],
+                                fpt.histogram[band_num, radius_num, bin_num],
+                                not_reached[band_num, radius_num],
+                            ]
+                        )
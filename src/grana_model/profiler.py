@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""statistical sampling profiler for overlap agent jobs
+
+A SamplingProfiler wakes up every interval seconds on a background thread,
+reads the current Python stack of the profiled thread with
+sys._current_frames() and counts it. Nothing is hooked into the profiled
+code, so the overhead is one stack walk per sample, and it stays low enough
+to leave on in real SLURM array jobs.
+
+Stacks are written in the collapsed format, one line per distinct stack:
+    run_overlapagent:main;overlapagent:run;space:step 1234
+which flamegraph.pl, speedscope and inferno read directly. Frames are
+labelled {module file stem}:{function}.
+
+merge_collapsed adds up the files of many jobs, and attribute splits the
+samples into the CATEGORIES below by the innermost frame on each stack that
+matches one of them.
+
+Example:
+    $ profiler = SamplingProfiler(interval=0.005)
+    $ profiler.start()
+    $ ...
+    $ profiler.stop()
+    $ profiler.write("profile/job.collapsed")
+
+"""
+import sys
+import threading
+from collections import Counter
+from pathlib import Path
+
+# category -> frame labels that belong to it, checked from the innermost
+# frame. A label ending in ":" matches every function of that module
+CATEGORIES = {
+    "collision_callbacks": {"collisionhandler:"},
+    "space_step": {"space:step"},
+    "geometry_scoring": {"geometryscorer:", "overlaparea:"},
+    "proposals": {
+        "proposals:next",
+        "proposals:_draw_block",
+        "psiistructure:action",
+        "psiistructure:apply_proposal",
+        "psiistructure:undo",
+        "utils:",
+        "random:choice",
+        "random:randint",
+    },
+    "export": {
+        "coordexport:",
+        "run_overlapagent:write_to_log",
+    },
+}
+
+
+def frame_label(frame) -> str:
+    code = frame.f_code
+    # spaces would break the collapsed format
+    return f"{Path(code.co_filename).stem}:{code.co_name}".replace(" ", "_")
+
+
+def frame_category(label: str):
+    """returns the category of a frame label, or None"""
+    module = label[: label.index(":") + 1]
+    for category, labels in CATEGORIES.items():
+        if label in labels or module in labels:
+            return category
+    return None
+
+
+class SamplingProfiler:
+    """Parameters:
+        interval (float): seconds between samples
+        thread_id (int): ident of the thread to profile, defaults to the
+        thread that creates the profiler
+    """
+
+    def __init__(self, interval: float = 0.005, thread_id: int = None):
+        self.interval = interval
+        self.thread_id = (
+            thread_id if thread_id is not None else threading.get_ident()
+        )
+        self.stacks = Counter()
+        self.num_samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """counts the current stack of the profiled thread"""
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        labels = []
+        while frame is not None:
+            labels.append(frame_label(frame))
+            frame = frame.f_back
+        self.stacks[";".join(reversed(labels))] += 1
+        self.num_samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write(self, path):
+        """writes the counted stacks in the collapsed format"""
+        write_collapsed(self.stacks, path)
+
+
+def write_collapsed(stacks: Counter, path):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+
+
+def read_collapsed(path) -> Counter:
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+def merge_collapsed(paths: list) -> Counter:
+    """adds up the stacks of every collapsed file in paths"""
+    stacks = Counter()
+    for path in paths:
+        stacks.update(read_collapsed(path))
+    return stacks
+
+
+def attribute(stacks: Counter) -> Counter:
+    """returns the number of samples in each of CATEGORIES, and in "other"
+    for stacks that match none of them"""
+    totals = Counter()
+    for stack, count in stacks.items():
+        category = "other"
+        for label in reversed(stack.split(";")):
+            match = frame_category(label)
+            if match is not None:
+                category = match
+                break
+        totals[category] += count
+    return totals
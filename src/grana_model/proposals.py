@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""batched proposal streams for the overlap agent
+
+Without a stream, every agent action makes several calls to the global random
+module: random.choice for the object, random.randint for the action, then
+rand_angle or the rejection loop of pos_in_circle. A ProposalStream draws all
+of these in blocks of block_size from its own numpy Generator, so the per
+action cost is a few list lookups, and a run is reproducible from one seed
+no matter what else uses the global random module.
+
+Each proposal is:
+    pick (float): in [0, 1), the object is zone_list[int(pick * len(zone_list))]
+    action_num (int): 1 to 6, as for PSIIStructure.action
+    dx, dy (float): uniform in the disc of radius tether_radius, used by moves
+    dangle (float): uniform in +/- half of degree_range, in radians, used by
+        rotations
+
+Replicas get independent streams from one seed through replica_streams, which
+spawns child seeds with numpy's SeedSequence. run_decomposed uses it to give
+every tile of every sync its own stream.
+
+Example:
+    $ proposals = ProposalStream(seed=1)
+    $ pick, action_num, dx, dy, dangle = proposals.next()
+
+"""
+from math import pi
+
+import numpy as np
+
+
+class ProposalStream:
+    """Parameters:
+        seed (int or SeedSequence): seeds the Generator, None for unseeded
+        block_size (int): number of proposals drawn at once
+        tether_radius (float): maximum move distance, as PSIIStructure.move
+        degree_range (float): rotation range in degrees, as
+        PSIIStructure.rotate
+    """
+
+    def __init__(
+        self,
+        seed=None,
+        block_size: int = 4096,
+        tether_radius: float = 1.0,
+        degree_range: float = 90.0,
+    ):
+        self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        self.tether_radius = tether_radius
+        self.degree_range = degree_range
+        self._block = []
+        self._position = 0
+
+    def _draw_block(self):
+        n = self.block_size
+        picks = self.rng.random(n)
+        action_nums = self.rng.integers(1, 7, size=n)
+        r = self.tether_radius * np.sqrt(self.rng.random(n))
+        t = 2 * pi * self.rng.random(n)
+        dangles = (self.rng.random(n) * 2 - 1) * (
+            0.5 * self.degree_range * pi / 180
+        )
+        # lists, so that taking one proposal doesn't touch numpy at all
+        self._block = list(
+            zip(
+                picks.tolist(),
+                action_nums.tolist(),
+                (r * np.cos(t)).tolist(),
+                (r * np.sin(t)).tolist(),
+                dangles.tolist(),
+            )
+        )
+        self._position = 0
+
+    def next(self) -> tuple:
+        """returns the next (pick, action_num, dx, dy, dangle) proposal"""
+        if self._position == len(self._block):
+            self._draw_block()
+        proposal = self._block[self._position]
+        self._position += 1
+        return proposal
+
+
+def replica_streams(seed, num_replicas: int, **kwargs) -> list:
+    """returns num_replicas independent ProposalStreams from one seed, 0 for
+    unseeded, or from a SeedSequence"""
+    if isinstance(seed, np.random.SeedSequence):
+        seed_seq = seed
+    else:
+        seed_seq = np.random.SeedSequence(seed if seed != 0 else None)
+    return [
+        ProposalStream(seed=child, **kwargs)
+        for child in seed_seq.spawn(num_replicas)
+    ]
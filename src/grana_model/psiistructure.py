@@ -1,12 +1,40 @@
-from math import degrees, sqrt
+from math import sqrt
 import random
-from pymunk import Vec2d, Body, moment_for_circle, Poly, Space
+from pymunk import Vec2d, Body, moment_for_circle, Poly, Space, Transform
 import os
 from pathlib import Path
+from .objectdata import OBJECT_TYPES
 from .utils import pos_in_circle, rand_angle
 
+# undo record action codes
+NO_ACTION = 0
+MOVE = 1
+ROTATE = 2
+
+KINEMATIC_TYPES = ["C2S2M2", "C2S2M", "C2S2", "C2", "C1"]
+
+# shared by every Poly built from a template, instead of one per shape
+_IDENTITY = Transform.identity()
+
 
 class PSIIStructure:
+    """a PSII (or secondary) structure: a pymunk Body with the compound or
+    simple shapes of its type. Uses __slots__ and keeps only a type code,
+    its index in the object list and a fixed-size undo record, so hundreds of
+    thousands of them stay cheap"""
+
+    __slots__ = (
+        "body",
+        "shapes",
+        "type_code",
+        "index",
+        "origin_xy",
+        "_undo_action",
+        "_undo_x",
+        "_undo_y",
+        "_undo_angle",
+    )
+
     def __init__(
         self,
         space: Space,
@@ -16,38 +44,110 @@ class PSIIStructure:
         pos: tuple[float, float],
         angle: float,
         mass=100,
+        index: int = -1,
     ):
-        self.obj_dict = obj_dict
-        self.type = obj_dict["obj_type"]
+        self.type_code = OBJECT_TYPES.index(obj_dict["obj_type"])
+        self.index = index
         self.origin_xy = pos
-        self.current_xy = pos
-        self.last_action = {
-            "action": "rotate",
-            "old_value": angle,
-            "new_value": angle,
-        }
-        self.new_scale = 100
+        self._undo_action = NO_ACTION
+        self._undo_x, self._undo_y = pos
+        self._undo_angle = angle
+
+        self.body = self._create_body(mass=mass, pos=pos, angle=angle)
+
+        self.shapes = self._create_shapes(
+            obj_dict=obj_dict, shape_type=shape_type
+        )
 
-        self.body = self._create_body(mass=mass, angle=angle)
+        # a space of None leaves adding body and shapes to the caller, so that
+        # bulk spawning can add everything with a single space.add() call
+        if space is not None:
+            space.add(self.body, *self.shapes)
 
-        shape_list, shape_str = self._create_shape_string(shape_type=shape_type)
-        eval(shape_str)
+    @classmethod
+    def from_template(
+        cls,
+        template: dict,
+        pos: tuple[float, float],
+        angle: float,
+        index: int = -1,
+    ):
+        """creates an object from a make_template() template without adding
+        it to a space. Builds the same body and shapes as __init__, with the
+        per-type work done once in the template"""
+        obj = cls.__new__(cls)
+        obj.type_code = template["type_code"]
+        obj.index = index
+        obj.origin_xy = pos
+        obj._undo_action = NO_ACTION
+        obj._undo_x, obj._undo_y = pos
+        obj._undo_angle = angle
+
+        body = Body(
+            mass=template["mass"],
+            moment=template["moment"],
+            body_type=template["body_type"],
+        )
+        body.position = pos
+        body.angle = angle
+        body.velocity_func = PSIIStructure.limit_velocity
+        obj.body = body
+
+        color = template["color"]
+        obj.shapes = []
+        for vertices in template["vertices"]:
+            shape = Poly(body, vertices, _IDENTITY)
+            shape.color = color
+            shape.collision_type = 1
+            obj.shapes.append(shape)
+
+        return obj
+
+    @staticmethod
+    def make_template(obj_dict: dict, shape_type: str, mass=100) -> dict:
+        """the per-type part of creating an object: type code, body type,
+        moment and shape vertices, for from_template()"""
+        if shape_type == "simple":
+            coord_list = obj_dict["shapes_simple"]
+        else:
+            coord_list = obj_dict["shapes_compound"]
+
+        return {
+            "type_code": OBJECT_TYPES.index(obj_dict["obj_type"]),
+            "mass": mass,
+            "moment": moment_for_circle(
+                mass=mass, inner_radius=0, outer_radius=10, offset=(0, 0)
+            ),
+            "body_type": Body.KINEMATIC
+            if obj_dict["obj_type"] in KINEMATIC_TYPES
+            else Body.DYNAMIC,
+            "vertices": [
+                [tuple(vertex) for vertex in shape_coord]
+                for shape_coord in coord_list
+            ],
+            "color": obj_dict["color"],
+        }
 
-    def _create_body(self, mass: float, angle: float):
+    @property
+    def type(self) -> str:
+        return OBJECT_TYPES[self.type_code]
+
+    def _create_body(self, mass: float, pos: tuple[float, float], angle: float):
         """create a pymunk.Body object with given mass, position, angle"""
 
         inertia = moment_for_circle(
             mass=mass, inner_radius=0, outer_radius=10, offset=(0, 0)
         )
 
-        if self.type in ["C2S2M2", "C2S2M", "C2S2", "C2", "C1"]:
+        if self.type in KINEMATIC_TYPES:
             body = Body(mass=mass, moment=inertia, body_type=Body.KINEMATIC)
         else:
             body = Body(mass=mass, moment=inertia, body_type=Body.DYNAMIC)
 
-        body.position = self.origin_xy  # given pos
+        body.position = pos  # given pos
         body.angle = angle
-        body.velocity_func = self.limit_velocity  # limit velocity
+        # a staticmethod, so every body shares one function object
+        body.velocity_func = PSIIStructure.limit_velocity  # limit velocity
 
         return body
 
@@ -61,51 +161,32 @@ class PSIIStructure:
             total_area += shape.area
         return total_area
 
-    def _create_shape_string(self, shape_type: str):
-        """create a shape_string that when provided as
-        an argument to eval(), will create all the compound or simple
-        shapes needed to define complex structures and
-        add them to the space along with self.body"""
+    def _create_shapes(self, obj_dict: dict, shape_type: str) -> list:
+        """create all the compound or simple shapes needed to define complex
+        structures, attached to self.body"""
 
         if shape_type == "simple":
-            coord_list = self.obj_dict["shapes_simple"]
+            coord_list = obj_dict["shapes_simple"]
         else:
-            coord_list = self.obj_dict["shapes_compound"]
-        shape_list = [
-            self._create_shape(shape_coord=shape_coord)
+            coord_list = obj_dict["shapes_compound"]
+
+        return [
+            self._create_shape(shape_coord=shape_coord, color=obj_dict["color"])
             for shape_coord in coord_list
         ]
 
-        return (
-            shape_list,
-            f"space.add(self.body, {','.join([str(f'shape_list[{i}]') for i, shape in enumerate(shape_list)])})",
-        )
-
-        # str_out = f"space.add({str_command})"
-
-        # #print(str_out)
-
-        # return shape_list, str_out
-
-    def _create_shape(self, shape_coord: tuple):
+    def _create_shape(self, shape_coord: tuple, color: tuple):
         """creates a shape"""
         my_shape = Poly(self.body, vertices=shape_coord)
 
-        my_shape.color = self.obj_dict["color"]
+        my_shape.color = color
 
         my_shape.collision_type = 1
 
         return my_shape
 
-    def update_sprite(self, sprite_scale_factor, rotation_factor):
-        self.sprite.rotation = degrees(-self.body.angle) + rotation_factor
-        self.sprite.position = self.body.position
-        if self.sprite.scale == sprite_scale_factor:
-            return
-        self.sprite.scale = sprite_scale_factor
-
-    def get_current_pos(self):
-        self.current_xy = (self.body.x, self.body.y)
+    def get_current_pos(self) -> tuple[float, float]:
+        return tuple(self.body.position)
 
     def go_home(self):
         direction = Vec2d(
@@ -113,7 +194,8 @@ class PSIIStructure:
         )
         self.body.apply_force_at_local_point(force=direction, point=(0, 0))
 
-    def limit_velocity(self, body, gravity, damping, dt):
+    @staticmethod
+    def limit_velocity(body, gravity, damping, dt):
         max_velocity = 1
         Body.update_velocity(body, gravity, damping, dt)
         body_velocity_length = body.velocity.length
@@ -122,10 +204,10 @@ class PSIIStructure:
             body.velocity = body.velocity * scale
 
     def undo(self):
-        if self.last_action["action"] == "rotate":
-            self.body.angle = self.last_action["old_value"]
-        if self.last_action["action"] == "move":
-            self.body.position = self.last_action["old_value"]
+        if self._undo_action == ROTATE:
+            self.body.angle = self._undo_angle
+        if self._undo_action == MOVE:
+            self.body.position = (self._undo_x, self._undo_y)
 
     def action(self, action_num):
         if action_num == 1:
@@ -134,20 +216,36 @@ class PSIIStructure:
         if action_num == 2:
             self.rotate(degree_range=90.0)
 
-    def _save_action(self, action: str, old_value, new_value):
-        self.last_action = {
-            "action": action,
-            "old_value": old_value,
-            "new_value": new_value,
-        }
+    def apply_proposal(self, action_num: int, dx: float, dy: float, dangle: float):
+        """action() with pre-drawn random values from a ProposalStream: moves
+        by (dx, dy) or rotates by dangle, and saves the undo record"""
+        if action_num == 1:
+            self._save_action(MOVE)
+            self.body.position = (self._undo_x + dx, self._undo_y + dy)
+
+        if action_num == 2:
+            self._save_action(ROTATE)
+            self.body.angle = self._undo_angle + dangle
+
+    def reset_origin(self):
+        """makes the current position the origin and clears the undo record,
+        for an object reused in a new configuration"""
+        self.origin_xy = tuple(self.body.position)
+        self._undo_action = NO_ACTION
+        self._undo_x, self._undo_y = self.origin_xy
+        self._undo_angle = self.body.angle
+
+    def _save_action(self, action: int):
+        """overwrites the undo record with the current state before action"""
+        self._undo_action = action
+        self._undo_x, self._undo_y = self.body.position
+        self._undo_angle = self.body.angle
 
     def rotate(self, degree_range: float):
         """ rotates the object to a random angle, plus or minus half degree_range"""
-        current_angle = self.body.angle
-
-        self.body.angle = current_angle + rand_angle(degree_range=degree_range)
+        self._save_action(ROTATE)
 
-        self._save_action("rotate", current_angle, self.body.angle)
+        self.body.angle = self._undo_angle + rand_angle(degree_range=degree_range)
 
     def move(self, tether_radius: float = 1.0):
         """ handles moving the object to a new location within its tether_radius.
@@ -158,11 +256,9 @@ class PSIIStructure:
             Parameters:
             tether_radius: the maximum distance from the original location of the object upon instantiation.
         """
-        start_pos = self.body.position
+        self._save_action(MOVE)
 
         self.body.position = pos_in_circle(
-            origin=self.body.position, radius=tether_radius
+            origin=(self._undo_x, self._undo_y), radius=tether_radius
         )
 
-        self._save_action("move", start_pos, self.body.position)
-
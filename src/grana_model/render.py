@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""headless frame renderer
+
+This module rasterises exported steps into RGB image arrays without pyglet
+or a display, so trajectory movies can be made on a compute node.
+
+Every object is drawn as the convex polygons of its type, the same shapes
+pymunk collides, in its OBJECT_COLORS colour. Polygons are filled with numpy,
+all at once: the pixel centres inside each polygon's bounding box are
+expanded into one flat array of (pixel, polygon) pairs and tested against
+the polygon edges. Where objects overlap, the one later in the file is drawn
+on top.
+
+Images are written as PNG with zlib and struct, or as raw rgb24 bytes that
+ffmpeg reads with -f rawvideo -pix_fmt rgb24.
+
+Example:
+    $ renderer = FrameRenderer(load_type_dict(), bounds=(0, 0, 400, 400))
+    $ write_png("frame_00000.png", renderer.render(read_frame(path)))
+
+"""
+import struct
+import zlib
+
+import numpy as np
+from pymunk import Poly
+
+from .objectdata import OBJECT_COLORS
+
+# polygon/pixel pairs tested at once, bounds the memory of a fill
+PAIRS_PER_CHUNK = 1 << 21
+
+
+def type_polygons(type_dict: dict, shape_type: str = "complex") -> dict:
+    """returns the convex hull of every shape of every type in local
+    coordinates, as pymunk makes them, padded into a (P, V, 2) array"""
+    key = "shapes_simple" if shape_type == "simple" else "shapes_compound"
+    polygons = {}
+    for obj_type, obj_dict in type_dict.items():
+        hulls = [
+            [(v.x, v.y) for v in Poly(None, coords).get_vertices()]
+            for coords in obj_dict[key]
+        ]
+        if not hulls:
+            polygons[obj_type] = np.empty((0, 3, 2))
+            continue
+        padded = np.empty((len(hulls), max(len(hull) for hull in hulls), 2))
+        for poly_num, hull in enumerate(hulls):
+            padded[poly_num, : len(hull)] = hull
+            padded[poly_num, len(hull) :] = hull[-1]
+        polygons[obj_type] = padded
+    return polygons
+
+
+def write_png(path, image: np.ndarray):
+    """writes an (h, w, 3) uint8 image as an 8 bit RGB png"""
+    height, width, _ = image.shape
+    # every scanline starts with filter type 0
+    raw = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (
+            struct.pack(">I", len(data))
+            + tag
+            + data
+            + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+        )
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bit depth, colour type 2 (RGB), no interlacing
+        header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+        f.write(chunk(b"IHDR", header))
+        f.write(chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)))
+        f.write(chunk(b"IEND", b""))
+
+
+def write_raw(path, image: np.ndarray):
+    """writes an (h, w, 3) uint8 image as raw rgb24 bytes"""
+    with open(path, "wb") as f:
+        f.write(np.ascontiguousarray(image).tobytes())
+
+
+class FrameRenderer:
+    """Parameters:
+        type_dict (dict): shape data, as from load_type_dict
+        bounds (tuple): (x_min, y_min, x_max, y_max) of the world area drawn
+        scale (float): pixels per world unit
+        shape_type (str): "complex" or "simple" shapes, as Spawner
+        background (tuple): RGB background colour
+    """
+
+    def __init__(
+        self,
+        type_dict: dict,
+        bounds: tuple = (0.0, 0.0, 400.0, 400.0),
+        scale: float = 2.0,
+        shape_type: str = "complex",
+        background: tuple = (255, 255, 255),
+    ):
+        self.bounds = bounds
+        self.scale = scale
+        self.width = int(round((bounds[2] - bounds[0]) * scale))
+        self.height = int(round((bounds[3] - bounds[1]) * scale))
+        self.background = np.array(background, dtype=np.uint8)
+
+        self.polygons = type_polygons(type_dict, shape_type)
+        self.max_vertices = max(p.shape[1] for p in self.polygons.values())
+        self.colors = {
+            obj_type: np.array(color[:3], dtype=np.uint8)
+            for obj_type, color in OBJECT_COLORS.items()
+        }
+
+    def _pixel_polygons(self, frame) -> tuple[np.ndarray, np.ndarray]:
+        """returns every polygon of the frame in pixel coordinates, with the
+        index of the object it belongs to"""
+        pixel_polys, owners = [], []
+        for obj_type in np.unique(frame.types):
+            local = self.polygons.get(obj_type)
+            if local is None or len(local) == 0:
+                continue
+            objects = np.flatnonzero(frame.types == obj_type)
+            cos_a = np.cos(frame.angles[objects])[:, None, None]
+            sin_a = np.sin(frame.angles[objects])[:, None, None]
+            x, y = local[None, ..., 0], local[None, ..., 1]
+            center = frame.positions[objects, None, None, :]
+            world_x = x * cos_a - y * sin_a + center[..., 0]
+            world_y = x * sin_a + y * cos_a + center[..., 1]
+
+            # image rows run downwards, so y is flipped
+            pixels = np.stack(
+                (
+                    (world_x - self.bounds[0]) * self.scale,
+                    (self.bounds[3] - world_y) * self.scale,
+                ),
+                axis=-1,
+            ).reshape(-1, local.shape[1], 2)
+            padding = self.max_vertices - local.shape[1]
+            if padding > 0:
+                pixels = np.concatenate(
+                    (pixels, np.repeat(pixels[:, -1:], padding, axis=1)), axis=1
+                )
+            pixel_polys.append(pixels)
+            owners.append(np.repeat(objects, len(local)))
+
+        if not pixel_polys:
+            return np.empty((0, 3, 2)), np.empty(0, dtype=int)
+
+        polys = np.concatenate(pixel_polys)
+        # the inside test needs one winding, the flip reversed it
+        signed_area = np.sum(
+            polys[..., 0] * np.roll(polys[..., 1], -1, axis=1)
+            - np.roll(polys[..., 0], -1, axis=1) * polys[..., 1],
+            axis=1,
+        )
+        polys[signed_area < 0] = polys[signed_area < 0, ::-1]
+        return polys, np.concatenate(owners)
+
+    def _fill(self, polys: np.ndarray, owners: np.ndarray, label: np.ndarray):
+        """writes the owner of every polygon into the label image pixels whose
+        centres it covers, keeping the highest owner where they overlap"""
+        col_min = np.maximum(np.ceil(polys[..., 0].min(axis=1) - 0.5), 0)
+        col_max = np.minimum(
+            np.floor(polys[..., 0].max(axis=1) - 0.5), self.width - 1
+        )
+        row_min = np.maximum(np.ceil(polys[..., 1].min(axis=1) - 0.5), 0)
+        row_max = np.minimum(
+            np.floor(polys[..., 1].max(axis=1) - 0.5), self.height - 1
+        )
+        num_cols = np.maximum(col_max - col_min + 1, 0).astype(np.int64)
+        num_rows = np.maximum(row_max - row_min + 1, 0).astype(np.int64)
+        counts = num_cols * num_rows
+
+        pair_poly = np.repeat(np.arange(len(polys)), counts)
+        within = np.arange(counts.sum()) - np.repeat(
+            np.cumsum(counts) - counts, counts
+        )
+        cols = col_min[pair_poly] + within % num_cols[pair_poly]
+        rows = row_min[pair_poly] + within // num_cols[pair_poly]
+
+        verts = polys[pair_poly]
+        edges = np.roll(verts, -1, axis=1) - verts
+        rel_x = (cols + 0.5)[:, None] - verts[..., 0]
+        rel_y = (rows + 0.5)[:, None] - verts[..., 1]
+        cross = edges[..., 0] * rel_y - edges[..., 1] * rel_x
+        inside = np.all(cross >= 0, axis=1)
+
+        pixel = (rows[inside] * self.width + cols[inside]).astype(np.int64)
+        np.maximum.at(label, pixel, owners[pair_poly[inside]])
+
+    def render(self, frame) -> np.ndarray:
+        """returns the frame as an (height, width, 3) uint8 RGB image"""
+        polys, owners = self._pixel_polygons(frame)
+        label = np.full(self.width * self.height, -1, dtype=np.int64)
+
+        if len(polys) > 0:
+            # chunks of polygons with a bounded number of bounding box pixels
+            extent = polys.max(axis=1) - polys.min(axis=1) + 2
+            box_pixels = extent[:, 0] * extent[:, 1]
+            chunk_ids = (np.cumsum(box_pixels) // PAIRS_PER_CHUNK).astype(int)
+            for chunk_id in np.unique(chunk_ids):
+                in_chunk = chunk_ids == chunk_id
+                self._fill(polys[in_chunk], owners[in_chunk], label)
+
+        type_colors = np.array(
+            [
+                self.colors.get(obj_type, self.background)
+                for obj_type in frame.types
+            ]
+            + [self.background],
+            dtype=np.uint8,
+        ).reshape(-1, 3)
+        # a label of -1 picks the background colour at the end
+        return type_colors[label].reshape(self.height, self.width, 3)
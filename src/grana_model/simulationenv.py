@@ -19,6 +19,9 @@ Todo:
    http://google.github.io/styleguide/pyguide.html
 
 """
+from collections import defaultdict
+
+import numpy as np
 import pymunk
 
 
@@ -29,24 +32,37 @@ import pymunk
 from .spawner import Spawner
 from .objectdata import ObjectDataExistingData, ObjectData
 from .collisionhandler import CollisionHandler
+from .snapshot import StateSnapshot
+from .spatialindex import choose_spatial_index
 
 
 class SimulationEnvironment:
     """represents a simulation environment, with pymunk.Space, PSIIStructures instantiated within it by a Spawner instance from a provided coord file."""
 
     def __init__(
-        self, pos_csv_filename: str, object_data_exists: bool, gui: bool = False
+        self,
+        pos_csv_filename: str,
+        object_data_exists: bool,
+        gui: bool = False,
+        spawn_seed: int = 0,
+        type_dict: dict = None,
+        threads: int = 1,
+        iterations: int = 10,
+        collision_slop: float = 0.1,
     ):
-        self.space = pymunk.Space()
+        self.space = self._create_space(
+            threads=threads,
+            iterations=iterations,
+            collision_slop=collision_slop,
+        )
 
         self.batch = None
+        self.spatial_index = "bbtree"
+        self.object_list = []
 
-        if object_data_exists:
-            object_data = ObjectDataExistingData(
-                pos_csv_filename=pos_csv_filename
-            )
-        else:
-            object_data = ObjectData(pos_csv_filename=pos_csv_filename)
+        object_data = self._load_object_data(
+            pos_csv_filename, object_data_exists, spawn_seed, type_dict
+        )
 
         self.spawner = Spawner(
             object_data=object_data,
@@ -56,6 +72,150 @@ class SimulationEnvironment:
             batch=self.batch,
             num_particles=0,
             num_psii=211,
+            spawn_seed=spawn_seed,
         )
 
         self.collision_handler = CollisionHandler(self.space)
+
+    @staticmethod
+    def _load_object_data(
+        pos_csv_filename: str,
+        object_data_exists: bool,
+        spawn_seed: int = 0,
+        type_dict: dict = None,
+    ) -> ObjectData:
+        if object_data_exists:
+            return ObjectDataExistingData(
+                pos_csv_filename=pos_csv_filename,
+                spawn_seed=spawn_seed,
+                type_dict=type_dict,
+            )
+        else:
+            return ObjectData(
+                pos_csv_filename=pos_csv_filename,
+                spawn_seed=spawn_seed,
+                type_dict=type_dict,
+            )
+
+    def setup_model(self):
+        """spawns the model through the spawner and keeps the object list, so
+        the environment can be reset later"""
+        self.object_list, particle_list = self.spawner.setup_model()
+        return self.object_list, particle_list
+
+    def reset(self, positions, angles, types: list) -> list:
+        """puts the environment into a new configuration, reusing the bodies
+        already in the space. Existing objects of each type are moved in
+        place; objects are only created or removed where the count of a type
+        differs. Returns the new object list, in the order of types"""
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        angles = np.asarray(angles, dtype=float)
+
+        available = defaultdict(list)
+        for obj in self.object_list:
+            available[obj.type].append(obj)
+
+        object_list = [None] * len(types)
+        missing = []
+        for index, obj_type in enumerate(types):
+            if available[obj_type]:
+                object_list[index] = available[obj_type].pop()
+            else:
+                missing.append(index)
+
+        surplus = [obj for objs in available.values() for obj in objs]
+        if surplus:
+            self.space.remove(
+                *[item for obj in surplus for item in (obj.body, *obj.shapes)]
+            )
+
+        if missing:
+            created = self.spawner.spawn_bulk(
+                [types[index] for index in missing],
+                positions[missing],
+                angles[missing],
+            )
+            for index, obj in zip(missing, created):
+                object_list[index] = obj
+
+        StateSnapshot(positions, angles).restore(object_list, space=self.space)
+        for index, obj in enumerate(object_list):
+            obj.index = index
+            obj.reset_origin()
+
+        self.collision_handler.reset_collision_count()
+        self.collision_handler.total_collision_count = 0
+
+        self.object_list = object_list
+        return self.object_list
+
+    def reset_from_file(
+        self, pos_csv_filename: str, object_data_exists: bool, spawn_seed=0
+    ) -> list:
+        """resets the environment to the objects generated from a coordinate
+        file, reusing the already loaded shape data. Unless the spawner only
+        spawns PSII, secondary structures are placed at random as in
+        setup_model"""
+        object_data = self._load_object_data(
+            pos_csv_filename,
+            object_data_exists,
+            spawn_seed,
+            type_dict=self.spawner.object_data.type_dict,
+        )
+        self.spawner.object_data = object_data
+
+        obj_list = list(object_data.object_list)[: self.spawner.num_psii]
+        positions = [obj["pos"] for obj in obj_list]
+        angles = [obj["angle"] for obj in obj_list]
+        types = [obj["obj_type"] for obj in obj_list]
+
+        if self.spawner.spawn_type != "psii_only":
+            num_secondary = int(
+                self.spawner.ratio_free_LHC * self.spawner.num_psii
+            )
+            types += ["cytb6f"] * num_secondary + ["LHCII"] * num_secondary
+            positions += self.spawner.random_pos_in_circle_array(
+                2 * num_secondary
+            ).tolist()
+            angles += self.spawner.random_angles(2 * num_secondary).tolist()
+
+        return self.reset(positions=positions, angles=angles, types=types)
+
+    def tune_spatial_index(
+        self, object_list: list, mode: str = "auto", benchmark: bool = False
+    ) -> str:
+        """sets the spatial index of the space once object_list has been
+        spawned. mode is "bbtree" (pymunk's default), "hash" or "auto", which
+        picks from the object shape sizes, or by timing the candidates if
+        benchmark is set. Returns a description of the chosen index"""
+        if mode == "bbtree":
+            self.spatial_index = "bbtree"
+            return self.spatial_index
+
+        self.spatial_index = choose_spatial_index(
+            self.space,
+            self.spawner.object_data.type_dict,
+            object_list,
+            shape_type=self.spawner.shape_type,
+            benchmark=benchmark and mode == "auto",
+            force_hash=mode == "hash",
+        )
+        return self.spatial_index
+
+    @staticmethod
+    def _create_space(
+        threads: int, iterations: int, collision_slop: float
+    ) -> pymunk.Space:
+        """creates the pymunk.Space, with the threaded solver when more than
+        one thread is asked for. pymunk only runs the threaded solver on
+        Linux and macOS, and uses at most 2 threads"""
+        if threads < 1:
+            raise ValueError(f"threads must be at least 1, got {threads}")
+
+        space = pymunk.Space(threaded=threads > 1)
+        if threads > 1:
+            space.threads = min(threads, 2)
+        space.iterations = iterations
+        space.collision_slop = collision_slop
+
+        return space
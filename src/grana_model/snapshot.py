@@ -0,0 +1,53 @@
+import numpy as np
+
+
+class StateSnapshot:
+    """the positions and angles of a list of objects, held as numpy arrays.
+
+    Capturing and restoring are O(n) array copies, much cheaper than pickling
+    or copying the pymunk Space, so snapshots can be used to keep the best
+    configuration seen so far or to fork a state and try several schedules
+    from it. The snapshot only holds the state of the objects, which must be
+    restored to the same object_list it was captured from."""
+
+    def __init__(self, positions: np.ndarray, angles: np.ndarray, overlap=None):
+        self.positions = positions
+        self.angles = angles
+        self.overlap = overlap
+
+    def __len__(self):
+        return len(self.angles)
+
+    @classmethod
+    def capture(cls, object_list: list, overlap: float = None):
+        positions = np.array(
+            [tuple(obj.body.position) for obj in object_list], dtype=float
+        ).reshape(-1, 2)
+        angles = np.array([obj.body.angle for obj in object_list], dtype=float)
+        return cls(positions, angles, overlap)
+
+    def restore(self, object_list: list, space=None):
+        """puts every object back to its captured position and angle, with
+        zero velocity. If space is given the shapes are reindexed too, which
+        scoring without space.step() needs"""
+        if len(object_list) != len(self):
+            raise ValueError(
+                f"snapshot holds {len(self)} objects, got {len(object_list)}"
+            )
+
+        for obj, pos, angle in zip(
+            object_list, self.positions.tolist(), self.angles.tolist()
+        ):
+            body = obj.body
+            body.position = pos
+            body.angle = angle
+            body.velocity = (0, 0)
+            body.angular_velocity = 0
+            if space is not None:
+                space.reindex_shapes_for_body(body)
+
+    def copy(self):
+        """returns an independent copy, for forking a state"""
+        return StateSnapshot(
+            self.positions.copy(), self.angles.copy(), self.overlap
+        )
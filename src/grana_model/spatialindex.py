@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""spatial index tuning
+
+pymunk uses a bounding box tree for its spatial index unless told otherwise.
+A spatial hash is usually faster when there are many shapes of similar size
+in a bounded area, which is what the grana model is, but it has to be sized:
+dim should be close to the size of a typical shape, and count (the number of
+hash cells) should be around 10 times the number of shapes.
+
+This module picks the index from the shape sizes in ObjectData.type_dict and
+the shape count, and can also microbenchmark the candidates on a throwaway
+copy of the space before choosing.
+
+Example:
+    $ description = choose_spatial_index(space, type_dict, object_list)
+
+"""
+from time import perf_counter
+
+import numpy as np
+import pymunk
+
+from .collisionhandler import CollisionHandler
+
+# use the spatial hash only if the largest shapes are at most this many times
+# the size of a typical shape, otherwise big shapes span too many cells
+MAX_SIZE_RATIO = 4.0
+CELLS_PER_SHAPE = 10
+
+
+def shape_sizes(type_dict: dict, object_types: list, shape_type: str):
+    """returns the bounding box size (the larger of width and height) of
+    every shape of every object in object_types"""
+    key = "shapes_simple" if shape_type == "simple" else "shapes_compound"
+    sizes_per_type = {
+        obj_type: [
+            float(np.ptp(np.asarray(coords, dtype=float), axis=0).max())
+            for coords in obj_dict[key]
+        ]
+        for obj_type, obj_dict in type_dict.items()
+    }
+    return np.array(
+        [size for obj_type in object_types for size in sizes_per_type[obj_type]]
+    )
+
+
+def suggest_spatial_hash(sizes: np.ndarray) -> tuple[float, int]:
+    """returns the (dim, count) for a spatial hash over shapes of these sizes"""
+    return float(np.median(sizes)), int(CELLS_PER_SHAPE * len(sizes))
+
+
+def describe(candidate: tuple) -> str:
+    if candidate[0] == "bbtree":
+        return "bbtree"
+    return f"hash(dim={candidate[1]:.2f},count={candidate[2]})"
+
+
+def apply_spatial_index(space: pymunk.Space, candidate: tuple):
+    """switches space to the candidate index. pymunk can't switch a space back
+    to the bounding box tree, so a bbtree candidate leaves it unchanged"""
+    if candidate[0] == "hash":
+        space.use_spatial_hash(candidate[1], candidate[2])
+
+
+def _clone_space(space: pymunk.Space) -> pymunk.Space:
+    """copies bodies and shapes into a new space with a collision handler,
+    so index candidates can be timed without touching the real space"""
+    clone = pymunk.Space()
+    clone.iterations = space.iterations
+    clone.collision_slop = space.collision_slop
+    CollisionHandler(clone)
+
+    for body in space.bodies:
+        if body.body_type == pymunk.Body.DYNAMIC:
+            new_body = pymunk.Body(body.mass, body.moment)
+        else:
+            new_body = pymunk.Body(body_type=body.body_type)
+        new_body.position = body.position
+        new_body.angle = body.angle
+
+        shapes = []
+        for shape in body.shapes:
+            new_shape = pymunk.Poly(new_body, shape.get_vertices())
+            new_shape.collision_type = shape.collision_type
+            shapes.append(new_shape)
+        clone.add(new_body, *shapes)
+
+    return clone
+
+
+def time_candidate(space: pymunk.Space, candidate: tuple, num_steps: int):
+    clone = _clone_space(space)
+    apply_spatial_index(clone, candidate)
+    clone.step(0.1)
+
+    start = perf_counter()
+    for _ in range(num_steps):
+        clone.step(0.1)
+    return (perf_counter() - start) / num_steps
+
+
+def choose_spatial_index(
+    space: pymunk.Space,
+    type_dict: dict,
+    object_list: list,
+    shape_type: str = "complex",
+    benchmark: bool = False,
+    num_steps: int = 20,
+    force_hash: bool = False,
+) -> str:
+    """picks a spatial index for space, applies it and returns a description
+    of the choice for the run log. With benchmark the bbtree and spatial hash
+    candidates are timed on copies of the space and the fastest is used.
+    force_hash skips the choice and applies the suggested spatial hash"""
+    sizes = shape_sizes(type_dict, [obj.type for obj in object_list], shape_type)
+    if len(sizes) == 0:
+        return describe(("bbtree",))
+
+    dim, count = suggest_spatial_hash(sizes)
+
+    if benchmark:
+        candidates = [("bbtree",)] + [
+            ("hash", dim * scale, count) for scale in [0.5, 1.0, 2.0]
+        ]
+        timings = [
+            time_candidate(space, candidate, num_steps)
+            for candidate in candidates
+        ]
+        choice = candidates[int(np.argmin(timings))]
+    elif force_hash or sizes.max() <= MAX_SIZE_RATIO * dim:
+        choice = ("hash", dim, count)
+    else:
+        choice = ("bbtree",)
+
+    apply_spatial_index(space, choice)
+    return describe(choice)
@@ -1,8 +1,12 @@
+import gc
+from itertools import islice
+
 from pymunk.space import Space
+import numpy as np
 from .psiistructure import PSIIStructure
 from .particle import Particle
+from .particleengine import ObstacleIndex, ParticleEngine
 from .objectdata import ObjectData
-from random import random
 from math import cos, sin, pi
 
 
@@ -19,6 +23,8 @@ class Spawner:
         spawn_type: str,
         num_particles: int = 1000,
         num_psii: int = 1000,
+        spawn_seed: int = 0,
+        particle_mode: str = "bodies",
     ):
         self.object_data = object_data
         self.num_psii = num_psii
@@ -27,18 +33,27 @@ class Spawner:
         self.ratio_cytb6f = 0.3  # 083021: Helmut says cyt b6f 70 (1/3 x PSII)
         self.shape_type = shape_type
         self.spawn_type = spawn_type
+        # "bodies": one pymunk Body per particle, "engine": a ParticleEngine
+        self.particle_mode = particle_mode
         self.space = space
         self.batch = batch
+        # per-type templates for spawn_bulk, keyed by object and shape type
+        self._templates = {}
+        self.rng = (
+            np.random.default_rng(spawn_seed)
+            if spawn_seed != 0
+            else np.random.default_rng()
+        )
 
     def random_angle(self) -> float:
         """returns a random angle in radians"""
-        return 2 * pi * random()
+        return 2 * pi * self.rng.random()
 
     def random_pos_in_circle(
         self, max_radius: float = 200, center: tuple[float, float] = (200, 200)
     ) -> tuple[float, float]:
         """return a random position in the circle"""
-        rand_roll = random() + random()
+        rand_roll = self.rng.random() + self.rng.random()
 
         if rand_roll > 1:
             r = (2 - rand_roll) * max_radius
@@ -49,49 +64,54 @@ class Spawner:
 
         return ((r * cos(t)) + center[0], center[1] + (r * sin(t)))
 
-    def setup_model(self):
-        """instantiates particles and obstacles according to spawner provided spawn_type"""
+    def random_angles(self, n: int) -> np.ndarray:
+        """returns an array of n random angles in radians"""
+        return 2 * pi * self.rng.random(n)
 
-        if self.spawn_type == "psii_only":
-            return self.spawn_psii(), self.spawn_particles_empty()
+    def random_pos_in_circle_array(
+        self,
+        n: int,
+        max_radius: float = 200,
+        center: tuple[float, float] = (200, 200),
+    ) -> np.ndarray:
+        """vectorized random_pos_in_circle, returns an (n, 2) array of
+        positions drawn from the same distribution"""
+        rand_roll = self.rng.random(n) + self.rng.random(n)
+        r = np.where(rand_roll > 1, 2 - rand_roll, rand_roll) * max_radius
+        t = self.random_angles(n)
+
+        return np.column_stack(
+            (center[0] + r * np.cos(t), center[1] + r * np.sin(t))
+        )
 
-        if self.spawn_type == "psii_secondary_noparticles":
-            return (
-                self.spawn_psii() + self.spawn_cytb6f() + self.spawn_lhcii(),
-                self.spawn_particles_empty(),
+    def setup_model(self):
+        """instantiates particles and obstacles according to spawner provided spawn_type"""
+        obj_list = list(islice(self.object_data.object_list, self.num_psii))
+        obj_types = [obj["obj_type"] for obj in obj_list]
+        positions = np.array([obj["pos"] for obj in obj_list], dtype=float)
+        angles = np.array([obj["angle"] for obj in obj_list], dtype=float)
+
+        if self.spawn_type != "psii_only":
+            num_secondary = int(self.ratio_free_LHC * self.num_psii)
+            obj_types += ["cytb6f"] * num_secondary + ["LHCII"] * num_secondary
+            positions = np.concatenate(
+                (
+                    positions.reshape(-1, 2),
+                    self.random_pos_in_circle_array(2 * num_secondary),
+                )
             )
-        else:
-            return (
-                self.spawn_psii() + self.spawn_cytb6f() + self.spawn_lhcii(),
-                self.spawn_particles(),
+            angles = np.concatenate(
+                (angles, self.random_angles(2 * num_secondary))
             )
 
-    def spawn_psii(self):
-        """spawns only psii obstacles into the simulation space to be rendered
-        as part of the provided batch, and appends them to the list provided
-        for later usage in the simulation model, up to a limit of self.num_psii"""
-
-        object_list = []
-
-        while len(object_list) < self.num_psii:
-            try:
-                obj = next(self.object_data.object_list)
-            except StopIteration:
-                return object_list
-            # #print(obj)
-            # if obj.get("obj_type") == "C2S2M2":
-            object_list.append(
-                PSIIStructure(
-                    self.space,
-                    obj,
-                    self.batch,
-                    self.shape_type,
-                    pos=obj.get("pos"),
-                    angle=obj.get("angle"),
-                )
-            )
+        object_list = self.spawn_bulk(obj_types, positions, angles)
 
-        return object_list
+        if self.spawn_type in ["psii_only", "psii_secondary_noparticles"]:
+            return object_list, self.spawn_particles_empty()
+        elif self.particle_mode == "engine":
+            return object_list, self.spawn_particle_engine(object_list)
+        else:
+            return object_list, self.spawn_particles()
 
     def spawn_particles(self):
         """Instantiates particles into the simulation space and returns a list
@@ -108,36 +128,67 @@ class Spawner:
 
         return object_list
 
+    def spawn_particle_engine(self, obstacle_list: list) -> ParticleEngine:
+        """creates a ParticleEngine with self.num_particles particles, which
+        are kept out of the shapes of the objects in obstacle_list"""
+        return ParticleEngine(
+            num_particles=self.num_particles,
+            obstacles=ObstacleIndex.from_objects(obstacle_list),
+            rng=self.rng,
+        )
+
     def spawn_particles_empty(self):
         """return an empty list for when you don't want to spawn particles"""
         return []
 
-    def spawn_lhcii(self):
-        """spawns LHCII and cytb6f objects into the simulation space"""
-        lhcii_list = [
-            PSIIStructure(
-                self.space,
-                self.object_data.type_dict["LHCII"],
-                self.batch,
-                self.shape_type,
-                pos=self.random_pos_in_circle(),
-                angle=self.random_angle(),
+    def _get_template(self, obj_type: str) -> dict:
+        key = (obj_type, self.shape_type)
+        if key not in self._templates:
+            self._templates[key] = PSIIStructure.make_template(
+                self.object_data.type_dict[obj_type], self.shape_type
             )
-            for _ in range(0, int(self.ratio_free_LHC * self.num_psii))
-        ]
-        return lhcii_list
-
-    def spawn_cytb6f(self):
-        """spawns cytb6f objects into the simulation space"""
-        cytb6f_list = [
-            PSIIStructure(
-                self.space,
-                self.object_data.type_dict["cytb6f"],
-                self.batch,
-                self.shape_type,
-                pos=self.random_pos_in_circle(),
-                angle=self.random_angle(),
+        return self._templates[key]
+
+    def spawn_bulk(
+        self, obj_types, positions: np.ndarray, angles: np.ndarray
+    ) -> list:
+        """creates a PSIIStructure for every entry of obj_types/positions/
+        angles, indexed in that order, and adds all bodies and shapes to the
+        space with a single space.add() call.
+
+        Objects are built from a per-type template, and the garbage collector
+        is paused while they are built: none of them is garbage, but the
+        millions of shapes of a large model would otherwise set off repeated
+        full collections. Cloning pymunk bodies and shapes from a template
+        with copy.deepcopy was tried and is much slower than building them"""
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            object_list = [
+                PSIIStructure.from_template(
+                    self._get_template(obj_type),
+                    pos=(x, y),
+                    angle=angle,
+                    index=index,
+                )
+                for index, (obj_type, (x, y), angle) in enumerate(
+                    zip(
+                        obj_types,
+                        np.asarray(positions, dtype=float).tolist(),
+                        np.asarray(angles, dtype=float).tolist(),
+                    )
+                )
+            ]
+
+            self.space.add(
+                *[
+                    item
+                    for obj in object_list
+                    for item in (obj.body, *obj.shapes)
+                ]
             )
-            for _ in range(0, int(self.ratio_free_LHC * self.num_psii))
-        ]
-        return cytb6f_list
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        return object_list
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""lease-based work queue on a shared directory
+
+A SLURM array gives every task a fixed share of the work, so fast tasks sit
+idle while slow ones straggle. A WorkQueue instead keeps the units of work
+as files in a directory every node can see, and workers claim units one at
+a time until none are left.
+
+The queue directory holds:
+    todo/{unit_id}.json: the parameters of every unit not yet finished
+    leases/{unit_id}.json: the worker running a unit, while it runs
+    done/{unit_id}.json: the parameters and result of every finished unit
+    failed/{unit_id}.json: the parameters and error of every failed unit
+
+A unit is claimed by creating its lease with O_CREAT | O_EXCL, which only
+one worker can do. While a worker runs the unit a heartbeat thread touches
+the lease, and a lease that hasn't been touched for lease_seconds belongs to
+a worker that died, so the next worker to see it breaks it and runs the unit
+again. Every file is written to a temporary name and renamed into place, so
+no reader sees half a file.
+
+A unit whose worker is only slow, not dead, can be run twice if its lease
+expires, so lease_seconds should be well above the heartbeat interval plus
+any clock difference between nodes. Every lease file holds a token, and a
+worker that finds its token gone when it finishes doesn't record the unit,
+leaving that to the worker that took it over. Units are never lost.
+
+Example:
+    $ work_queue = WorkQueue("queue/")
+    $ work_queue.add({"a_s1": {"filename": "a.csv", "seed": 1}})
+    $ while work_queue.unit_ids("todo"):
+    $     lease = work_queue.claim("node1")
+    $     if lease is None:
+    $         sleep(work_queue.heartbeat_interval)
+    $         continue
+    $     with lease:
+    $         lease.complete(run(**lease.params))
+    $ results = work_queue.results()
+
+"""
+import json
+import os
+import random
+import threading
+import uuid
+from pathlib import Path
+from time import time
+
+STATES = ["todo", "leases", "done", "failed"]
+
+
+def _write_json_atomic(path: Path, data: dict):
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: Path):
+    """returns the contents of a json file, or None if it has gone"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class Lease:
+    """a claimed unit of work. Used as a context manager, it heartbeats the
+    lease file while the unit runs"""
+
+    def __init__(
+        self, work_queue, unit_id: str, params: dict, worker_id: str, token: str
+    ):
+        self.work_queue = work_queue
+        self.unit_id = unit_id
+        self.params = params
+        self.worker_id = worker_id
+        # written into the lease file, tells this lease from a later one
+        self.token = token
+        self.path = work_queue.path("leases", unit_id)
+        # set when the lease is found broken by another worker
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _check(self) -> bool:
+        """sets lost if the lease file is gone or belongs to another claim,
+        returns whether the lease is still held"""
+        if not self.lost:
+            try:
+                lease = _read_json(self.path)
+            except ValueError:
+                # another worker's claim, still being written
+                lease = None
+            self.lost = lease is None or lease.get("token") != self.token
+        return not self.lost
+
+    def heartbeat(self):
+        if not self._check():
+            return
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            self.lost = True
+
+    def _run(self):
+        while not self._stop.wait(self.work_queue.heartbeat_interval):
+            self.heartbeat()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def complete(self, result: dict) -> bool:
+        """records the result of the unit and removes it from the queue.
+        Returns False without recording anything if the lease was lost, as
+        the worker that took the unit over records it instead"""
+        return self._finish("done", {"result": result})
+
+    def fail(self, error: str) -> bool:
+        """records the unit as failed and removes it from the queue, it is
+        not retried. Returns False if the lease was lost, as complete()"""
+        return self._finish("failed", {"error": error})
+
+    def _finish(self, state: str, record: dict) -> bool:
+        if not self._check():
+            return False
+        _write_json_atomic(
+            self.work_queue.path(state, self.unit_id),
+            {
+                "unit_id": self.unit_id,
+                "params": self.params,
+                "worker_id": self.worker_id,
+                **record,
+            },
+        )
+        for path in [self.work_queue.path("todo", self.unit_id), self.path]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        return True
+
+
+class WorkQueue:
+    """Parameters:
+        root (str): the shared queue directory, created if missing
+        lease_seconds (float): seconds without a heartbeat before a lease
+        is broken
+    """
+
+    def __init__(self, root, lease_seconds: float = 300.0):
+        self.root = Path(root)
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = lease_seconds / 4
+        for state in STATES:
+            (self.root / state).mkdir(parents=True, exist_ok=True)
+        # own generator, so claiming doesn't change seeded runs
+        self._rng = random.Random()
+
+    def path(self, state: str, unit_id: str) -> Path:
+        return self.root / state / f"{unit_id}.json"
+
+    def unit_ids(self, state: str) -> list:
+        return sorted(
+            path.stem
+            for path in (self.root / state).glob("*.json")
+            if not path.name.startswith(".")
+        )
+
+    def add(self, units: dict) -> int:
+        """queues every unit of a unit_id -> params dict that isn't queued or
+        finished already, returns the number added"""
+        num_added = 0
+        for unit_id, params in units.items():
+            if any(
+                self.path(state, unit_id).exists()
+                for state in ["todo", "done", "failed"]
+            ):
+                continue
+            _write_json_atomic(self.path("todo", unit_id), params)
+            num_added += 1
+        return num_added
+
+    def _expired(self, lease_path: Path) -> bool:
+        try:
+            return time() - lease_path.stat().st_mtime > self.lease_seconds
+        except FileNotFoundError:
+            return False
+
+    def _break(self, lease_path: Path):
+        """removes an expired lease. The rename lets only one of several
+        workers breaking the same lease succeed"""
+        stale_path = lease_path.with_name(
+            f".{lease_path.name}.{uuid.uuid4().hex}.stale"
+        )
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return
+        if not self._expired(stale_path):
+            # another worker broke and reclaimed it in between, put it back
+            try:
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                pass
+        os.remove(stale_path)
+
+    def claim(self, worker_id: str):
+        """returns a Lease on an unclaimed unit, or None when every unit is
+        finished or leased"""
+        unit_ids = self.unit_ids("todo")
+        # workers starting together would otherwise all race for the first
+        self._rng.shuffle(unit_ids)
+        for unit_id in unit_ids:
+            todo_path = self.path("todo", unit_id)
+            if self.path("done", unit_id).exists():
+                # a worker finished it but died before removing it
+                try:
+                    os.remove(todo_path)
+                except FileNotFoundError:
+                    pass
+                continue
+
+            lease_path = self.path("leases", unit_id)
+            if self._expired(lease_path):
+                self._break(lease_path)
+            try:
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                continue
+            token = uuid.uuid4().hex
+            with os.fdopen(fd, "w") as f:
+                json.dump(
+                    {"worker_id": worker_id, "claimed": time(), "token": token},
+                    f,
+                )
+
+            params = _read_json(todo_path)
+            if params is None:
+                # finished between listing and claiming
+                os.remove(lease_path)
+                continue
+            return Lease(self, unit_id, params, worker_id, token)
+        return None
+
+    def status(self) -> dict:
+        """the number of units in each state, leased units also count as
+        todo"""
+        return {state: len(self.unit_ids(state)) for state in STATES}
+
+    def results(self) -> list:
+        """the records of every finished unit, ordered by unit_id"""
+        records = [
+            _read_json(self.path("done", unit_id))
+            for unit_id in self.unit_ids("done")
+        ]
+        return [record for record in records if record is not None]